@@ -0,0 +1,69 @@
+"""Time per item for category matching: compiled matcher vs. the old rule loop.
+
+    python benchmarks/bench_categorizer.py --rules 10000 --items 6000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# models import the engine module; no connection is opened by this benchmark
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://localhost/receipts")
+
+from categorizer import RuleMatcher  # noqa: E402
+
+
+def _word(rng: random.Random, low: int, high: int) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(low, high)))
+
+
+def _naive_match(rules, text):
+    for pattern, category_id, name in rules:
+        if pattern in text:
+            return category_id, name
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=6_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patterns = {_word(rng, 4, 10) for _ in range(args.rules)}
+    rules = [(pattern, rng.randint(1, 40), f"cat-{idx % 40}") for idx, pattern in enumerate(patterns)]
+    merchants = [_word(rng, 5, 12) for _ in range(50)]
+    texts = [
+        f"{_word(rng, 3, 12)} {_word(rng, 3, 12)} {rng.choice(merchants)}"
+        for _ in range(args.items)
+    ]
+
+    started = time.perf_counter()
+    matcher = RuleMatcher(rules)
+    compile_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compiled = [matcher.match(text) for text in texts]
+    compiled_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    naive = [_naive_match(rules, text) for text in texts]
+    naive_time = time.perf_counter() - started
+
+    for got, expected in zip(compiled, naive):
+        assert (got.category_id, got.category_name) == expected if got else expected is None
+
+    print(f"rules: {len(rules)}, items: {len(texts)}, matched: {sum(1 for m in compiled if m)}")
+    print(f"compile:        {compile_time * 1000:10.1f} ms")
+    print(f"compiled match: {compiled_time / len(texts) * 1e6:10.2f} us/item")
+    print(f"rule loop:      {naive_time / len(texts) * 1e6:10.2f} us/item")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Ingestion queue throughput by number of workers and worker processes.
+
+Enqueues fresh lookups into ingest_jobs and works them off with worker
+pools of growing size against the FS stub, printing jobs/s. Each process
+is one `cli.py worker`: its workers share one event loop, on which
+persisting runs, so past a few dozen jobs/s more processes help where more
+workers no longer do. Run the API with JOB_WORKERS=0 (or not at all) so
+only these workers claim jobs.
+
+    python benchmarks/fs_stub.py --port 9000 --latency-ms 100 &
+    FS_API_URL=http://127.0.0.1:9000/mdu/api/v1/opd/receipt/find \\
+        python benchmarks/bench_jobs.py --jobs 400 --workers 1 4 16 --processes 1 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import func, select  # noqa: E402
+
+import fs_client  # noqa: E402
+import jobs  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal, async_engine, engine  # noqa: E402
+
+
+def _enqueue(count: int, run: str) -> list[uuid.UUID]:
+    with SessionLocal() as session:
+        return [
+            jobs.enqueue(session, {"receipt_id": f"O-BENCH-{run}-{index:06d}"}).id
+            for index in range(count)
+        ]
+
+
+def _pending(ids: list[uuid.UUID]) -> int:
+    with SessionLocal() as session:
+        return session.scalar(
+            select(func.count())
+            .select_from(models.IngestJob)
+            .where(models.IngestJob.id.in_(ids), models.IngestJob.status.not_in(jobs.FINISHED))
+        )
+
+
+async def _serve(workers: int, name: str, stop) -> None:
+    await fs_client.startup()
+    pool = jobs.WorkerPool(workers, name=name)
+    pool.start()
+    try:
+        await asyncio.to_thread(stop.wait)
+    finally:
+        await pool.shutdown()
+        await fs_client.shutdown()
+
+
+def _process(workers: int, name: str, stop) -> None:
+    # connections pooled before the fork belong to the parent
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    asyncio.run(_serve(workers, name, stop))
+
+
+def _drain(processes: int, workers: int, ids: list[uuid.UUID]) -> float:
+    stop = multiprocessing.Event()
+    started = time.perf_counter()
+    children = [
+        multiprocessing.Process(target=_process, args=(workers, f"bench-{index}", stop))
+        for index in range(processes)
+    ]
+    for child in children:
+        child.start()
+    while _pending(ids):
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for child in children:
+        child.join()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="per process")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        for workers in args.workers:
+            ids = _enqueue(args.jobs, uuid.uuid4().hex[:8])
+            elapsed = _drain(processes, workers, ids)
+            print(
+                f"{processes:2d} x {workers:3d} workers: {args.jobs} jobs in {elapsed:6.2f} s"
+                f"  {args.jobs / elapsed:8.1f} jobs/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Duplicate scans answered locally versus through FS.
+
+Checks first that every stored receipt is found again by its id and by the
+offline (OKP) QR code built from its payload, that made-up keys are not,
+and that the Bloom filter has no false negatives; then times QR parsing,
+the filter and the lookup, and POST /receipts/fetch of already stored
+receipts with and without the local lookup (the latter needs the FS stub):
+
+    python benchmarks/generate_data.py --receipts 20000 --seed 7
+    python benchmarks/fs_stub.py --port 9000 --latency-ms 100 &
+    FS_API_URL=http://127.0.0.1:9000/mdu/api/v1/opd/receipt/find \\
+        python benchmarks/bench_known_receipts.py --sample 500
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+import ekasa  # noqa: E402
+import fs_client  # noqa: E402
+import models  # noqa: E402
+import services  # noqa: E402
+import synthetic  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from main import app  # noqa: E402
+
+
+def _sample(session, size: int) -> list[tuple[str, str]]:
+    """(receipt_id, offline QR code) of random stored receipts that have an OKP."""
+    receipt_ids = session.scalars(
+        select(models.Receipt.receipt_id)
+        .where(models.Receipt.okp.is_not(None))
+        .order_by(func.random())
+        .limit(size)
+    ).all()
+    return [
+        (receipt_id, synthetic.offline_qr_code(services.get_receipt_payload(session, receipt_id)))
+        for receipt_id in receipt_ids
+    ]
+
+
+def check_equivalence(session, sample: list[tuple[str, str]], unknown: int) -> None:
+    for receipt_id, qr_code in sample:
+        for key in (ekasa.receipt_key(receipt_id, None), ekasa.parse_qr(qr_code)):
+            found = services.find_known_receipt(session, key)
+            if found != receipt_id:
+                raise SystemExit(f"{key}: found {found!r}, expected {receipt_id!r}")
+    made_up = [ekasa.parse_qr(f"O-{uuid.uuid4().hex.upper()}") for _ in range(unknown)]
+    for key in made_up:
+        if services.find_known_receipt(session, key) is not None:
+            raise SystemExit(f"{key.value} reported as stored")
+    # the batch endpoint resolves all its keys in one query
+    keys = [
+        key
+        for receipt_id, qr_code in sample
+        for key in (ekasa.receipt_key(receipt_id, None), ekasa.parse_qr(qr_code))
+    ]
+    keys += made_up + [None]
+    random.shuffle(keys)
+    if services.find_known_receipts(session, keys) != [
+        services.find_known_receipt(session, key) if key else None for key in keys
+    ]:
+        raise SystemExit("find_known_receipts differs from find_known_receipt")
+    print(f"equivalence: {len(sample)} stored receipts found by id and OKP, {unknown} unknown ids not,"
+          " batch lookup matches single ones")
+
+
+def _per_call(fn, args: list, repeat: int = 1) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for arg in args:
+            fn(arg)
+    return (time.perf_counter() - started) / (len(args) * repeat) * 1e6
+
+
+@contextmanager
+def _without_lookup():
+    find = services.find_known_receipt
+    services.find_known_receipt = lambda session, key: None
+    try:
+        yield
+    finally:
+        services.find_known_receipt = find
+
+
+def _fetch_duplicates(client: TestClient, sample: list[tuple[str, str]]) -> float:
+    started = time.perf_counter()
+    for receipt_id, _ in sample:
+        response = client.post("/receipts/fetch", json={"receipt_id": receipt_id})
+        response.raise_for_status()
+    return (time.perf_counter() - started) / len(sample) * 1000
+
+
+def _fs_reachable() -> bool:
+    try:
+        httpx.post(fs_client.FS_API_URL, json={}, timeout=2)
+    except httpx.HTTPError:
+        return False
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", type=int, default=500)
+    parser.add_argument("--unknown", type=int, default=2000)
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        started = time.perf_counter()
+        loaded = services.load_known_receipts(session)
+        print(f"filter: {loaded} receipts loaded in {time.perf_counter() - started:.2f} s,"
+              f" {services._known_receipts.memory() / 1e6:.1f} MB")
+        sample = _sample(session, args.sample)
+        if not sample:
+            parser.error("no receipts with an OKP, fill the database with generate_data.py")
+        check_equivalence(session, sample, args.unknown)
+
+        qr_codes = [key for pair in sample for key in pair]
+        stored_keys = [ekasa.parse_qr(code).value for _, code in sample] + [rid for rid, _ in sample]
+        if not all(services._known_receipts.might_contain(key) for key in stored_keys):
+            raise SystemExit("Bloom filter false negative")
+        made_up = [f"O-{uuid.uuid4().hex.upper()}" for _ in range(args.unknown * 10)]
+        false_positives = sum(services._known_receipts.might_contain(key) for key in made_up)
+        print(f"filter false positives: {false_positives / len(made_up):.4%}"
+              f" (expected {services._known_receipts.stats()['false_positive_rate']:.4%})")
+
+        print(f"parse_qr:              {_per_call(ekasa.parse_qr, qr_codes, 20):8.2f} us")
+        print(f"filter, stored key:    {_per_call(services._known_receipts.might_contain, stored_keys, 20):8.2f} us")
+        print(f"filter, unknown key:   {_per_call(services._known_receipts.might_contain, made_up):8.2f} us")
+        keys = [ekasa.parse_qr(code) for _, code in sample]
+        random.shuffle(keys)
+        print(f"lookup, stored (OKP):  {_per_call(lambda key: services.find_known_receipt(session, key), keys) / 1000:8.3f} ms")
+
+    with TestClient(app) as client:
+        print(f"POST /receipts/fetch, duplicate, local:   {_fetch_duplicates(client, sample):8.2f} ms")
+        if _fs_reachable():
+            with _without_lookup():
+                print(f"POST /receipts/fetch, duplicate, via FS:  {_fetch_duplicates(client, sample):8.2f} ms")
+        else:
+            print(f"FS at {fs_client.FS_API_URL} not reachable, skipping the comparison")
+
+
+if __name__ == "__main__":
+    main()
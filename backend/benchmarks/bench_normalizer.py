@@ -0,0 +1,136 @@
+"""normalizer.parse_timestamp vs. dateutil's isoparse in _normalize_receipt.
+
+First checks that parse_timestamp returns what isoparse does (value and
+tzinfo, None where isoparse raises) on fixed edge cases and randomly
+generated timestamps. Then it times services._normalize_receipt on
+realistic payloads with each parser: median of --repeat runs, gc off.
+
+    python benchmarks/bench_normalizer.py --cases 20000 --receipts 5000
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# services imports the engine module; no connection is opened by this benchmark
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://localhost/receipts")
+
+from dateutil import parser as dateutil_parser  # noqa: E402
+
+import normalizer  # noqa: E402
+import services  # noqa: E402
+import synthetic  # noqa: E402
+
+TIMESTAMPS = [
+    "2024-05-01T10:00:00+02:00",
+    "2024-05-01T10:00:00Z",
+    "2024-05-01T10:00:00+00:00",
+    "2024-05-01T10:00:00-00:00",
+    "2024-05-01T10:00:00-05:30",
+    "2024-05-01T10:00:00",
+    "2024-05-01T10:00:00.5",
+    "2024-05-01T10:00:00.123456+01:00",
+    "2024-05-01T10:00:00.1234567Z",
+    "2024-05-01T24:00:00",
+    "2024-02-30T10:00:00",
+    "2024-05-01 10:00:00",
+    "2024-05-01",
+    "20240501T100000",
+    "2024-05-01T10:00",
+    "2024-05-01T10:00:00+0100",
+    "not a date",
+    "",
+    0,
+    1714550400,
+    None,
+]
+
+
+def isoparse(value):
+    try:
+        return dateutil_parser.isoparse(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def random_timestamp(rng: random.Random) -> str:
+    value = (
+        f"{rng.randint(1, 9999):04d}-{rng.randint(0, 13):02d}-{rng.randint(0, 32):02d}"
+        f"T{rng.randint(0, 25):02d}:{rng.randint(0, 60):02d}:{rng.randint(0, 60):02d}"
+    )
+    if rng.random() < 0.3:
+        value += "." + "".join(rng.choice("0123456789") for _ in range(rng.randint(1, 7)))
+    roll = rng.random()
+    if roll < 0.3:
+        value += "Z"
+    elif roll < 0.7:
+        value += f"{rng.choice('+-')}{rng.randint(0, 25):02d}:{rng.randint(0, 60):02d}"
+    return value
+
+
+def check_equivalence(cases: int, seed: int) -> None:
+    rng = random.Random(seed)
+    values = TIMESTAMPS + [random_timestamp(rng) for _ in range(cases)]
+    for value in values:
+        # equal datetimes can still differ in tzinfo; compare the rendering
+        expected, actual = repr(isoparse(value)), repr(normalizer.parse_timestamp(value))
+        if expected != actual:
+            raise AssertionError(f"timestamp {value!r}: {expected} != {actual}")
+    print(f"equivalence: {len(values)} timestamps identical")
+
+
+def _time(fn, payloads, repeat: int) -> float:
+    runs = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for payload in payloads:
+                fn(payload)
+            runs.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return statistics.median(runs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=20_000)
+    parser.add_argument("--receipts", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    check_equivalence(args.cases, args.seed)
+
+    payloads = [synthetic.make_payload(synthetic.receipt_id_for(index)) for index in range(args.receipts)]
+    items = sum(len(payload["receipt"]["items"]) for payload in payloads)
+    issue_dates = [payload["receipt"]["issueDate"] for payload in payloads]
+    fast = normalizer.parse_timestamp
+    timings = {}
+    for label, parse in (("isoparse", isoparse), ("parse_timestamp", fast)):
+        normalizer.parse_timestamp = parse
+        try:
+            timings[label] = (
+                _time(parse, issue_dates, args.repeat),
+                _time(services._normalize_receipt, payloads, args.repeat),
+            )
+        finally:
+            normalizer.parse_timestamp = fast
+    print(f"{args.receipts} receipts, {items} items, median of {args.repeat} runs")
+    (parse_before, before), (parse_after, after) = timings.values()
+    for label, (parse, normalize) in timings.items():
+        print(
+            f"{label:16} timestamp {parse / args.receipts * 1e6:5.2f} us"
+            f"  _normalize_receipt {normalize / args.receipts * 1e6:6.2f} us/receipt"
+        )
+    print(f"speedup: timestamp x{parse_before / parse_after:.2f}, _normalize_receipt x{before / after:.2f}")
+
+
+if __name__ == "__main__":
+    main()
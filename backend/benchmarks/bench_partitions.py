@@ -0,0 +1,152 @@
+"""Partitions scanned and latency of the date-ranged item queries.
+
+Runs /stats series, search, receipt detail and export for a date window
+twice: as they are, and with the partition_date predicates of
+`partitioning.prune` left out. Both runs must return the same rows; for
+each query the EXPLAIN ANALYZE of its SQL shows how many item partitions
+were scanned out of how many exist.
+
+Sizing the table for the 100M item target takes ~6.7M receipts at the
+default 15 items on average (a few hours and ~40 GB of disk):
+
+    python benchmarks/generate_data.py --receipts 6700000 --start 2019-01-01 --end 2026-01-01
+    python benchmarks/bench_partitions.py --from 2025-03-01 --to 2025-04-01
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import event, text  # noqa: E402
+
+import export  # noqa: E402
+import partitioning  # noqa: E402
+import services  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+
+def _date(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+@contextmanager
+def _without_pruning():
+    prune = partitioning.prune
+    partitioning.prune = lambda column, start, end: []
+    try:
+        yield
+    finally:
+        partitioning.prune = prune
+
+
+@contextmanager
+def _captured():
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if " items" in statement and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def _scanned(plan: dict) -> set[str]:
+    names = set()
+    # scans left in the plan but pruned at run time show up as never executed
+    if plan.get("Relation Name", "").startswith(partitioning.PARENT + "_") and plan.get("Actual Loops"):
+        names.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        names |= _scanned(child)
+    return names
+
+
+def _explain(statements) -> int:
+    scanned = set()
+    with engine.connect() as connection:
+        cursor = connection.connection.cursor()
+        for statement, parameters in statements:
+            cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scanned |= _scanned(plan[0]["Plan"])
+    return len(scanned)
+
+
+def _queries(window: tuple[datetime, datetime], receipt_id: str, query: str):
+    start, end = window
+
+    def series(session):
+        services._series_cache.clear()
+        return services.stats_series(session, start, end, "day", "category")
+
+    def search(session):
+        return services.search_items(session, query, date_from=start, date_to=end)
+
+    def detail(session):
+        return services.get_receipt_detail(session, receipt_id)
+
+    def export_rows(session):
+        return list(export._export_rows(session, start, end, export.EXPORT_BATCH_SIZE))
+
+    return {"stats series": series, "search": search, "detail": detail, "export": export_rows}
+
+
+def _run(fn, iterations: int) -> tuple[object, float, int]:
+    samples = []
+    with SessionLocal() as session:
+        with _captured() as statements:
+            result = fn(session)
+        for _ in range(iterations):
+            started = time.perf_counter()
+            fn(session)
+            samples.append(time.perf_counter() - started)
+    return result, statistics.median(samples) * 1000, _explain(statements)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="date_from", type=_date, default=_date("2025-03-01"))
+    parser.add_argument("--to", dest="date_to", type=_date, default=_date("2025-04-01"))
+    parser.add_argument("--query", default="mlieko", help="search text")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    with engine.connect() as connection:
+        total = len(partitioning.partitions(connection))
+        items = connection.execute(text("SELECT count(*) FROM items")).scalar()
+        receipt_id = connection.execute(
+            text(
+                "SELECT receipt_id FROM receipts WHERE issue_date >= :start AND issue_date < :end"
+                " ORDER BY issue_date LIMIT 1"
+            ),
+            {"start": args.date_from, "end": args.date_to},
+        ).scalar()
+    if receipt_id is None:
+        parser.error("no receipts in the window, fill the database with generate_data.py")
+    print(f"{items} items in {total} partitions, window {args.date_from:%Y-%m-%d}..{args.date_to:%Y-%m-%d}")
+
+    for name, fn in _queries((args.date_from, args.date_to), receipt_id, args.query).items():
+        with _without_pruning():
+            expected, unpruned_ms, unpruned_scanned = _run(fn, args.iterations)
+        result, pruned_ms, pruned_scanned = _run(fn, args.iterations)
+        if result != expected:
+            raise SystemExit(f"{name}: results differ with and without pruning")
+        print(
+            f"{name:13s} partitions {unpruned_scanned:3d} -> {pruned_scanned:3d} of {total}"
+            f"   {unpruned_ms:9.1f} ms -> {pruned_ms:9.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Size of the receipts table and latency of the receipt list/detail queries.
+
+Run against a populated database before and after a schema change:
+
+    python benchmarks/bench_receipt_rows.py --iterations 200
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+import services  # noqa: E402
+from database import SessionLocal  # noqa: E402
+
+
+def _timed(fn, iterations: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        receipts, heap, total, avg_row = session.execute(
+            text(
+                "SELECT count(*), pg_relation_size('receipts'),"
+                " pg_total_relation_size('receipts'), avg(pg_column_size(r.*))"
+                " FROM receipts r"
+            )
+        ).one()
+        print(f"receipts: {receipts}")
+        print(f"receipts heap: {heap / 1024 / 1024:.1f} MiB, with TOAST and indexes: {total / 1024 / 1024:.1f} MiB")
+        print(f"avg receipts row: {float(avg_row or 0):.0f} B")
+        for table in ("receipt_payloads",):
+            exists = session.execute(text("SELECT to_regclass(:t)"), {"t": table}).scalar()
+            if exists:
+                size = session.execute(text("SELECT pg_total_relation_size(:t)"), {"t": table}).scalar()
+                print(f"{table}: {size / 1024 / 1024:.1f} MiB")
+
+        sample = session.execute(text("SELECT receipt_id FROM receipts LIMIT 1")).scalar()
+
+        def list_page():
+            services.list_receipts(session, limit=args.limit)
+            session.expunge_all()
+
+        def detail():
+            services.get_receipt(session, receipt_id=sample)
+            session.expunge_all()
+
+        p50, p95 = _timed(list_page, args.iterations)
+        print(f"list_receipts(limit={args.limit}): p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+        if sample:
+            p50, p95 = _timed(detail, args.iterations)
+            print(f"get_receipt: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Rows/s of the receipt list, detail and NDJSON export serialization.
+
+The "model" path is what the endpoints did before: full ORM objects,
+`model_validate`, then FastAPI's second validation of the response_model
+and `json.dumps`. The "rows" path selects only the response columns and
+encodes them with serialization.dumps. Both outputs are compared first, so
+a run also checks that the fast path returns the same JSON.
+
+    python benchmarks/bench_serialization.py --iterations 50 --export-chunks 10
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+import export  # noqa: E402
+import models  # noqa: E402
+import schemas  # noqa: E402
+import serialization  # noqa: E402
+import services  # noqa: E402
+from database import SessionLocal  # noqa: E402
+
+_list_adapter = TypeAdapter(list[schemas.ReceiptOut])
+_detail_adapter = TypeAdapter(schemas.ReceiptDetail)
+
+
+def _response_body(adapter: TypeAdapter, content) -> bytes:
+    # FastAPI's serialize_response + JSONResponse.render
+    value = adapter.validate_python(content, from_attributes=True)
+    return json.dumps(
+        adapter.dump_python(value, mode="json"), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def model_list(session, limit: int) -> bytes:
+    receipt = models.Receipt
+    receipts = session.execute(
+        select(receipt).order_by(receipt.issue_date.desc().nulls_first(), receipt.id.desc()).limit(limit)
+    ).scalars().all()
+    return _response_body(_list_adapter, [schemas.ReceiptOut.model_validate(r) for r in receipts])
+
+
+def rows_list(session, limit: int) -> bytes:
+    rows, _ = services.list_receipts(session, limit=limit)
+    return serialization.dumps([row._asdict() for row in rows])
+
+
+def model_detail(session, receipt_id: str) -> bytes:
+    receipt = services.get_receipt(session, receipt_id=receipt_id)
+    return _response_body(_detail_adapter, schemas.ReceiptDetail.model_validate(receipt))
+
+
+def rows_detail(session, receipt_id: str) -> bytes:
+    return serialization.dumps(services.get_receipt_detail(session, receipt_id=receipt_id))
+
+
+def _sorted_items(detail: dict) -> dict:
+    return {**detail, "items": sorted(detail["items"], key=lambda item: item["id"])}
+
+
+def _rate(fn, rows_per_call: int, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return rows_per_call * iterations / (time.perf_counter() - started)
+
+
+def _export(session, limit: int) -> tuple[int, float]:
+    started = time.perf_counter()
+    lines = 0
+    for chunk in itertools.islice(export.iter_ndjson(session), limit):
+        lines += chunk.count(b"\n")
+    return lines, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--export-chunks", type=int, default=20, help="NDJSON chunks (2000 receipts each)")
+    args = parser.parse_args()
+    encoder = "orjson" if serialization.orjson is not None else "json"
+
+    with SessionLocal() as session:
+        fast = json.loads(rows_list(session, args.limit))
+        slow = json.loads(model_list(session, args.limit))
+        assert fast == slow, "list: rows path differs from the response_model output"
+        sample = [entry["receipt_id"] for entry in fast[:20]]
+        for receipt_id in sample:
+            fast = _sorted_items(json.loads(rows_detail(session, receipt_id)))
+            slow = _sorted_items(json.loads(model_detail(session, receipt_id)))
+            assert fast == slow, f"detail {receipt_id}: rows path differs"
+            session.expunge_all()
+        print(f"equivalence: list page and {len(sample)} details identical")
+
+        def each(fn, arg):
+            def call():
+                fn(session, arg)
+                session.expunge_all()
+            return call
+
+        before = _rate(each(model_list, args.limit), args.limit, args.iterations)
+        after = _rate(each(rows_list, args.limit), args.limit, args.iterations)
+        print(f"list {args.limit} rows: model {before:9.0f} rows/s   rows+{encoder} {after:9.0f} rows/s   x{after / before:.1f}")
+
+        details = itertools.cycle(sample)
+        before = _rate(lambda: (model_detail(session, next(details)), session.expunge_all()), 1, args.iterations * 4)
+        after = _rate(lambda: rows_detail(session, next(details)), 1, args.iterations * 4)
+        print(f"detail:          model {before:9.0f} req/s    rows+{encoder} {after:9.0f} req/s    x{after / before:.1f}")
+
+        if serialization.orjson is not None:
+            lines, fast_elapsed = _export(session, args.export_chunks)
+            orjson, serialization.orjson = serialization.orjson, None
+            try:
+                slow_lines, slow_elapsed = _export(session, args.export_chunks)
+            finally:
+                serialization.orjson = orjson
+            print(
+                f"export ndjson {lines} receipts: json {slow_lines / slow_elapsed:9.0f} receipts/s"
+                f"   orjson {lines / fast_elapsed:9.0f} receipts/s   x{slow_elapsed / fast_elapsed:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
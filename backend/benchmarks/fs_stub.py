@@ -0,0 +1,95 @@
+"""Local stand-in for the FS `receipt/find` API.
+
+Answers every lookup with a synthetic payload (see synthetic.py), after a
+configurable delay, and fails a configurable share of calls:
+
+    python benchmarks/fs_stub.py --port 9000 --latency-ms 80 --jitter-ms 40 \
+        --error-rate 0.02 --not-found-rate 0.01
+    FS_API_URL=http://127.0.0.1:9000/mdu/api/v1/opd/receipt/find uvicorn main:app
+
+GET /stub/stats returns the number of answers per status code.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# synthetic.py imports seed/models; no connection is opened by the stub
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://localhost/receipts")
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import synthetic  # noqa: E402
+
+FIND_PATH = "/mdu/api/v1/opd/receipt/find"
+
+
+def create_app(
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    not_found_rate: float = 0.0,
+    max_items: int = 30,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI(title="FS API stub")
+    rng = random.Random(seed)
+    answered: Counter = Counter()
+
+    @app.post(FIND_PATH)
+    async def find(request: Request):
+        delay = latency_ms + rng.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = rng.random()
+        if roll < error_rate:
+            answered[503] += 1
+            return JSONResponse({"detail": "stub: service unavailable"}, status_code=503)
+        if roll < error_rate + not_found_rate:
+            answered[404] += 1
+            return JSONResponse({"detail": "stub: receipt not found"}, status_code=404)
+        payload = synthetic.payload_for_lookup(await request.json(), max_items=max_items)
+        if payload is None:
+            answered[400] += 1
+            return JSONResponse({"detail": "stub: receiptId or qrCode required"}, status_code=400)
+        answered[200] += 1
+        return payload
+
+    @app.get("/stub/stats")
+    def stats():
+        return dict(answered)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 answers")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="share of 404 answers")
+    parser.add_argument("--max-items", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        not_found_rate=args.not_found_rate,
+        max_items=args.max_items,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Fill the database with synthetic receipts for the benchmark scenarios.
+
+Receipt ids are derived from --seed and the receipt index, so the same
+command always produces the same data and re-running it only adds what is
+missing:
+
+    python benchmarks/generate_data.py --receipts 100000 --start 2023-01-01 --end 2026-01-01
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import categorizer  # noqa: E402
+import services  # noqa: E402
+import synthetic  # noqa: E402
+from database import SessionLocal, init_db  # noqa: E402
+
+
+def _date(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=10_000)
+    parser.add_argument("--start", type=_date, default=synthetic.DEFAULT_START)
+    parser.add_argument("--end", type=_date, default=synthetic.DEFAULT_END)
+    parser.add_argument("--max-items", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--source", default="bench")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.perf_counter()
+    created = items = 0
+    with SessionLocal() as session:
+        matcher = categorizer.get_matcher(session)
+        for offset in range(0, args.receipts, args.batch_size):
+            prepared = [
+                services.prepare_receipt(
+                    synthetic.make_payload(
+                        synthetic.receipt_id_for(index, args.seed),
+                        start=args.start,
+                        end=args.end,
+                        max_items=args.max_items,
+                    ),
+                    args.source,
+                    matcher,
+                )
+                for index in range(offset, min(offset + args.batch_size, args.receipts))
+            ]
+            result = services.insert_prepared(session, prepared)
+            session.commit()
+            created += len(result.created)
+            items += sum(
+                len(entry.items) for entry in prepared if entry.receipt["receipt_id"] in result.created
+            )
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(
+                f"{offset + len(prepared)}/{args.receipts} receipts, {created} new,"
+                f" {items} items, {created / elapsed:.0f} receipts/s",
+                file=sys.stderr,
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
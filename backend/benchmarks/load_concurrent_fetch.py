@@ -0,0 +1,86 @@
+"""Concurrent POST /receipts/fetch load test against a running backend.
+
+Sends synthetic `payload` receipts (no FS call) with N concurrent clients and
+pings /health meanwhile. If DB writes block the event loop, the health pings
+queue up behind them and their latency grows with the concurrency.
+
+    uvicorn main:app --port 8000 &
+    python benchmarks/load_concurrent_fetch.py --url http://localhost:8000 -c 32 -n 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def _payload(items: int) -> dict:
+    return {
+        "receiptId": f"LOAD-{uuid.uuid4().hex}",
+        "issueDate": "2024-03-15T12:00:00+01:00",
+        "organization": {"name": "Load Test s.r.o."},
+        "totalPrice": items * 1.25,
+        "items": [{"name": f"polozka {idx}", "price": 1.25} for idx in range(items)],
+    }
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=40)
+    args = parser.parse_args()
+
+    latencies: list[float] = []
+    health: list[float] = []
+    statuses: dict[int, int] = {}
+    remaining = iter(range(args.requests))
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+
+        async def worker() -> None:
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/receipts/fetch", json={"payload": _payload(args.items)}
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def pinger() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                health.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        ping_task = asyncio.create_task(pinger())
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ping_task
+
+    print(f"requests: {len(latencies)}  concurrency: {args.concurrency}  statuses: {statuses}")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+    for label, values in (("fetch", latencies), ("health", health)):
+        if values:
+            print(
+                f"{label:7s} p50 {_percentile(values, 0.50) * 1000:7.1f} ms"
+                f"  p95 {_percentile(values, 0.95) * 1000:7.1f} ms"
+                f"  p99 {_percentile(values, 0.99) * 1000:7.1f} ms"
+                f"  mean {statistics.mean(values) * 1000:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+"""Scripted load scenarios against a running backend.
+
+    python benchmarks/fs_stub.py --port 9000 &
+    FS_API_URL=http://127.0.0.1:9000/mdu/api/v1/opd/receipt/find uvicorn main:app --port 8000 &
+    python benchmarks/generate_data.py --receipts 20000
+    python benchmarks/scenarios.py --url http://localhost:8000 -c 16 -n 2000 --json run.json
+    python benchmarks/scenarios.py ... --compare run.json   # exit 1 on a p95 regression
+
+Scenarios (pick with --scenario, default all):
+  fetch   POST /receipts/fetch with new receipt ids, resolved by the FS stub
+  list    GET /receipts with random filters, following the cursor half the time
+  detail  GET /receipts/{id} for ids seen in the listing
+  stats   GET /stats for random months of the generated range
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+SCENARIOS = ("fetch", "list", "detail", "stats")
+MERCHANT_PREFIXES = ("lidl", "tesco", "shell", "ikea", "bistro", "omv")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient, rng: random.Random, args: argparse.Namespace):
+        self.client = client
+        self.rng = rng
+        self.args = args
+        self.receipt_ids: list[str] = []
+        self.cursor: Optional[str] = None
+
+    async def prepare(self) -> None:
+        cursor = None
+        while len(self.receipt_ids) < self.args.sample_ids:
+            params = {"limit": 200, **({"cursor": cursor} if cursor else {})}
+            response = await self.client.get("/receipts", params=params)
+            response.raise_for_status()
+            self.receipt_ids.extend(entry["receipt_id"] for entry in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+    def fetch(self) -> Awaitable[httpx.Response]:
+        return self.client.post(
+            "/receipts/fetch", json={"receipt_id": f"O-{uuid.uuid4().hex.upper()}"}
+        )
+
+    async def list(self) -> httpx.Response:
+        params: dict = {"limit": self.rng.choice((20, 50, 100))}
+        if self.cursor and self.rng.random() < 0.5:
+            params["cursor"] = self.cursor
+        elif self.rng.random() < 0.3:
+            params["merchant"] = self.rng.choice(MERCHANT_PREFIXES)
+        elif self.rng.random() < 0.3:
+            year = self.rng.randint(self.args.start_year, self.args.end_year)
+            params["date_from"] = f"{year}-01-01T00:00:00"
+            params["date_to"] = f"{year + 1}-01-01T00:00:00"
+        response = await self.client.get("/receipts", params=params)
+        self.cursor = response.headers.get("X-Next-Cursor")
+        return response
+
+    def detail(self) -> Awaitable[httpx.Response]:
+        return self.client.get(f"/receipts/{self.rng.choice(self.receipt_ids)}")
+
+    def stats(self) -> Awaitable[httpx.Response]:
+        return self.client.get(
+            "/stats",
+            params={
+                "year": self.rng.randint(self.args.start_year, self.args.end_year),
+                "month": self.rng.randint(1, 12),
+            },
+        )
+
+
+async def _run(
+    name: str,
+    call: Callable[[], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                status = str((await call()).status_code)
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+    }
+
+
+def _compare(results: list[dict], baseline_path: str, tolerance: float) -> bool:
+    baseline = {entry["scenario"]: entry for entry in json.loads(open(baseline_path).read())["results"]}
+    ok = True
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if before is None:
+            continue
+        ratio = result["p95_ms"] / max(before["p95_ms"], 1e-9)
+        regressed = ratio > 1 + tolerance
+        ok = ok and not regressed
+        print(
+            f"{result['scenario']:7s} p95 {before['p95_ms']:8.1f} -> {result['p95_ms']:8.1f} ms"
+            f" ({ratio - 1:+.0%}){'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--requests", type=int, default=1000, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per scenario")
+    parser.add_argument("--sample-ids", type=int, default=2000)
+    parser.add_argument("--start-year", type=int, default=2023)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth")
+    args = parser.parse_args()
+
+    results = []
+    async with httpx.AsyncClient(
+        base_url=args.url,
+        timeout=60,
+        limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency),
+    ) as client:
+        scenario = Scenario(client, random.Random(args.seed), args)
+        await scenario.prepare()
+        for name in args.scenario or SCENARIOS:
+            if name == "detail" and not scenario.receipt_ids:
+                print("detail: no receipts in the database, skipped", file=sys.stderr)
+                continue
+            call = getattr(scenario, name)
+            if args.warmup:
+                await _run(name, call, args.warmup, args.concurrency)
+            result = await _run(name, call, args.requests, args.concurrency)
+            results.append(result)
+            print(
+                f"{name:7s} {result['requests']:6d} req  {result['throughput']:8.1f} req/s"
+                f"  p50 {result['p50_ms']:7.1f}  p95 {result['p95_ms']:7.1f}"
+                f"  p99 {result['p99_ms']:7.1f} ms  {result['statuses']}",
+                flush=True,
+            )
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(
+                {"url": args.url, "at": datetime.now().isoformat(timespec="seconds"), "results": results},
+                handle,
+                indent=2,
+            )
+    if args.compare and not _compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,118 @@
+"""Deterministic synthetic FS `receipt/find` payloads for the benchmarks.
+
+Merchants and item names are derived from `seed.DEFAULT_CATEGORIES`, so the
+default category rules match most items the way they would on real data.
+The payload for a receipt id is always the same, which lets the FS stub and
+the data generator agree without sharing state.
+"""
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from seed import DEFAULT_CATEGORIES
+
+DEFAULT_START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+DEFAULT_END = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+_MERCHANTS = {
+    "Potraviny": ["LIDL Slovenská republika, v.o.s.", "TESCO STORES SR, a.s.", "COOP Jednota Slovensko"],
+    "Doprava": ["SHELL Slovakia, s.r.o.", "OMV Slovensko, s.r.o.", "Dopravný podnik mesta, a.s."],
+    "Domácnosť": ["IKEA Bratislava, s.r.o.", "HORNBACH-Baumarkt SK spol. s r.o.", "OBI Slovakia s.r.o."],
+    "Stravovanie": ["Bistro Centrum s.r.o.", "Kaviareň Cafe Nová", "Irish Pub Dublin s.r.o."],
+}
+_PRODUCTS = {
+    "Potraviny": ["mlieko polotučné 1l", "chlieb tmavý", "maslo 250g", "jogurt biely", "rožok", "syr eidam", "banány", "jablká"],
+    "Doprava": ["natural 95", "diesel", "cestovný lístok mhd", "umývanie auta", "diaľničná známka"],
+    "Domácnosť": ["žiarovka led", "skrutky 4x40", "kvetináč", "elektro predlžovačka", "farba biela 5l"],
+    "Stravovanie": ["espresso", "cappuccino", "menu dňa", "polievka", "pivo 0.5l", "cheesecake"],
+}
+# items no default rule matches (the "Nezaradené" share of the stats)
+_UNMATCHED = ["taška", "záloha fľaša", "darčeková karta", "batérie aa", "noviny"]
+
+
+def _catalog() -> list[tuple[str, list[str], list[str]]]:
+    catalog = []
+    for category in DEFAULT_CATEGORIES:
+        name = category["name"]
+        products = _PRODUCTS.get(name, []) + [f"{keyword} {name.lower()}" for keyword in category["keywords"]]
+        merchants = _MERCHANTS.get(name) or [f"{category['keywords'][0].upper()} s.r.o."]
+        catalog.append((name, merchants, products))
+    return catalog
+
+
+CATALOG = _catalog()
+
+
+def receipt_id_for(index: int, seed: int = 0) -> str:
+    """Stable eKasa-like receipt id ("O-" + 32 hex digits) for a generator index."""
+    return "O-" + hashlib.md5(f"{seed}:{index}".encode()).hexdigest().upper()
+
+
+def okp_for(receipt_id: str) -> str:
+    """Stable OKP code (5 dash-separated groups of 8 hex digits) of a receipt id."""
+    digits = hashlib.sha1(receipt_id.encode()).hexdigest().upper()
+    return "-".join(digits[start : start + 8] for start in range(0, 40, 8))
+
+
+def offline_qr_code(payload: dict[str, Any]) -> str:
+    """QR code string an offline receipt with this payload would carry."""
+    receipt = payload["receipt"]
+    issued = datetime.fromisoformat(receipt["issueDate"])
+    return (
+        f"{receipt['okp']}:{receipt['cashRegisterCode']}:{issued:%y%m%d%H%M%S}"
+        f":{receipt['receiptNumber']}:{receipt['totalPrice']:.2f}"
+    )
+
+
+def make_payload(
+    receipt_id: str,
+    start: datetime = DEFAULT_START,
+    end: datetime = DEFAULT_END,
+    max_items: int = 30,
+) -> dict[str, Any]:
+    rng = random.Random(receipt_id)
+    _, merchants, products = rng.choice(CATALOG)
+    merchant = rng.choice(merchants)
+    issued = start + timedelta(seconds=rng.randrange(int((end - start).total_seconds())))
+    items = []
+    for _ in range(rng.randint(1, max_items)):
+        name = rng.choice(_UNMATCHED) if rng.random() < 0.15 else rng.choice(products)
+        quantity = rng.choice((1, 1, 1, 2, 3)) if rng.random() < 0.8 else round(rng.uniform(0.1, 2.5), 3)
+        unit_price = round(rng.uniform(0.3, 40.0), 2)
+        items.append(
+            {
+                "name": name.upper() if rng.random() < 0.3 else name,
+                "itemType": "K",
+                "quantity": quantity,
+                "price": round(unit_price * quantity, 2),
+                "vatRate": rng.choice((10, 20, 23)),
+            }
+        )
+    return {
+        "receipt": {
+            "receiptId": receipt_id,
+            "okp": okp_for(receipt_id),
+            "ico": f"{rng.randrange(10**7, 10**8)}",
+            "cashRegisterCode": f"88820{rng.randrange(10**11, 10**12)}",
+            "issueDate": issued.astimezone(timezone(timedelta(hours=1))).isoformat(),
+            "receiptNumber": rng.randint(1, 9999),
+            "type": "PD",
+            "totalPrice": round(sum(item["price"] for item in items), 2),
+            "organization": {
+                "name": merchant,
+                "ico": f"{rng.randrange(10**7, 10**8)}",
+                "municipality": rng.choice(("Bratislava", "Košice", "Žilina", "Nitra")),
+                "country": "Slovensko",
+            },
+            "items": items,
+        }
+    }
+
+
+def payload_for_lookup(body: dict[str, Any], **kwargs: Any) -> Optional[dict[str, Any]]:
+    """Payload the FS stub answers for a `{"receiptId"|"qrCode": ...}` lookup."""
+    receipt_id = body.get("receiptId") or body.get("qrCode")
+    if not receipt_id:
+        return None
+    return make_payload(str(receipt_id), **kwargs)
@@ -0,0 +1,426 @@
+import asyncio
+import hashlib
+import logging
+import math
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+
+try:  # optional shared backend (pip install redis)
+    import redis
+except ImportError:  # pragma: no cover - depends on the environment
+    redis = None
+
+MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+_registry: dict[str, Any] = {}
+
+
+def register(cache: Any) -> None:
+    _registry[cache.name] = cache
+
+
+def all_stats() -> dict[str, dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        register(self)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def _sizeof(value: Any) -> int:
+    """Rough size in bytes of a cached value (payload bytes, rows, headers)."""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_sizeof(entry) for entry in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class TaggedCache:
+    """TTLCache whose entries carry tags; `invalidate(tag)` drops every entry
+    with that tag, so writers evict exactly what they made stale.
+
+    Take `snapshot()` before reading the data to cache and pass it to `set`:
+    a value read while an invalidation ran is then not stored.
+    """
+
+    backend = "memory"
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+        self.bytes = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any, frozenset, int]] = OrderedDict()
+        self._tagged: dict[str, set[Hashable]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        register(self)
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, tags, size = self._data.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def snapshot(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = (), snapshot: Optional[int] = None) -> None:
+        tags = frozenset(tags)
+        size = _sizeof(value)
+        with self._lock:
+            if snapshot is not None and snapshot != self._generation:
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tags, size)
+            self.bytes += size
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, *tags: str) -> None:
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tagged.get(tag, ())):
+                    self._drop(key)
+                    self.invalidated += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._tagged.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def memory(self) -> int:
+        return self.bytes
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "bytes": self.bytes,
+            "tags": len(self._tagged),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidated": self.invalidated,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class RedisTaggedCache:
+    """TaggedCache on a Redis server shared by all API and worker processes.
+
+    Tags are version counters: an entry keeps the versions its tags had when
+    it was stored and reads as a miss once any of them moved, so invalidating
+    is one INCR per tag however many entries carry it. Values are pickled;
+    the server has to be as trusted as the database. Redis errors count as
+    misses, the API keeps working on the database alone.
+    """
+
+    backend = "redis"
+
+    def __init__(self, name: str, url: str, ttl: float):
+        if redis is None:
+            raise RuntimeError("Zdieľaná cache vyžaduje balík redis (pip install redis)")
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._client = redis.Redis.from_url(url)
+        self._prefix = f"cache:{name}:"
+        register(self)
+
+    def _entry(self, key: Hashable) -> str:
+        return self._prefix + "entry:" + hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def _tag(self, tag: str) -> str:
+        return self._prefix + "tag:" + tag
+
+    def snapshot(self) -> Optional[int]:
+        try:
+            return int(self._client.get(self._prefix + "generation") or 0)
+        except redis.RedisError:
+            self.errors += 1
+            return None
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        try:
+            raw = self._client.get(self._entry(key))
+            if raw is not None:
+                value, versions = pickle.loads(raw)
+                current = self._client.mget([self._tag(tag) for tag in versions]) if versions else []
+                if all(int(now or 0) == then for now, then in zip(current, versions.values())):
+                    self.hits += 1
+                    return value
+        except redis.RedisError:
+            self.errors += 1
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = (), snapshot: Optional[int] = None) -> None:
+        tags = sorted(set(tags))
+        try:
+            generation, *versions = self._client.mget(
+                [self._prefix + "generation", *(self._tag(tag) for tag in tags)]
+            )
+            if snapshot is not None and int(generation or 0) != snapshot:
+                return
+            entry = (value, {tag: int(version or 0) for tag, version in zip(tags, versions)})
+            self._client.set(self._entry(key), pickle.dumps(entry), ex=max(1, round(self.ttl)))
+        except redis.RedisError:
+            self.errors += 1
+
+    def invalidate(self, *tags: str) -> None:
+        try:
+            with self._client.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.incr(self._tag(tag))
+                pipe.incr(self._prefix + "generation")
+                pipe.execute()
+        except redis.RedisError:
+            self.errors += 1
+            logger.exception("cache %s: invalidating %s failed", self.name, tags)
+
+    def clear(self) -> None:
+        try:
+            keys = list(self._client.scan_iter(match=self._prefix + "entry:*"))
+            if keys:
+                self._client.delete(*keys)
+            self._client.incr(self._prefix + "generation")
+        except redis.RedisError:
+            self.errors += 1
+
+    def memory(self) -> int:
+        """Memory used by the whole Redis server, 0 when it is unreachable."""
+        try:
+            return self._client.info("memory")["used_memory"]
+        except redis.RedisError:
+            return 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "ttl": self.ttl,
+            "server_bytes": self.memory(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def tagged_cache(name: str, maxsize: int, ttl: float, url: Optional[str] = None) -> Any:
+    """A RedisTaggedCache when `url` is set, else an in-process TaggedCache."""
+    if url:
+        return RedisTaggedCache(name, url, ttl)
+    return TaggedCache(name, maxsize, ttl)
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives.
+
+    Sized for `capacity` keys at `error_rate`; `might_contain` is False only
+    for keys never added. Until `loaded` is set (the bulk load finished) it
+    answers True for everything, so callers fall back to the exact check.
+    """
+
+    def __init__(self, name: str, capacity: int, error_rate: float = 0.01):
+        self.name = name
+        self.loaded = False
+        self.negatives = 0
+        self.positives = 0
+        self._lock = threading.Lock()
+        self.reset(capacity, error_rate)
+        register(self)
+
+    def reset(self, capacity: int, error_rate: float = 0.01) -> None:
+        capacity = max(capacity, 1)
+        bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        with self._lock:
+            self.capacity = capacity
+            self.error_rate = error_rate
+            self.count = 0
+            self.loaded = False
+            self._hashes = max(1, round(bits / capacity * math.log(2)))
+            self._size = bits
+            self._bits = bytearray((bits + 7) // 8)
+
+    def _positions(self, key: str) -> range:
+        # double hashing: k positions first + i * second from one 128-bit digest;
+        # taken modulo the size by the callers
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=16).digest(), "little")
+        second = (digest >> 64) | 1
+        first = digest & 0xFFFFFFFFFFFFFFFF
+        return range(first, first + self._hashes * second, second)
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            size, bits = self._size, self._bits
+            for position in self._positions(key):
+                position %= size
+                bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def might_contain(self, key: str) -> bool:
+        if not self.loaded:
+            return True
+        size, bits = self._size, self._bits
+        for position in self._positions(key):
+            position %= size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                self.negatives += 1
+                return False
+        self.positives += 1
+        return True
+
+    def memory(self) -> int:
+        return len(self._bits)
+
+    def stats(self) -> dict[str, Any]:
+        # expected false positive rate at the current fill
+        fill = 1 - math.exp(-self._hashes * self.count / self._size)
+        return {
+            "loaded": self.loaded,
+            "keys": self.count,
+            "capacity": self.capacity,
+            "bytes": len(self._bits),
+            "hashes": self._hashes,
+            "false_positive_rate": round(fill ** self._hashes, 6),
+            "negatives": self.negatives,
+            "positives": self.positives,
+        }
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one awaited task.
+
+    The task is shielded, so a caller that gets cancelled does not cancel the
+    lookup for the others waiting on it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.joins = 0
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        register(self)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.joins += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every caller went away
+
+    def stats(self) -> dict[str, Any]:
+        return {"in_flight": len(self._inflight), "calls": self.calls, "joins": self.joins}
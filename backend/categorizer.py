@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+
+RULES_CACHE_TTL = float(os.getenv("RULES_CACHE_TTL", "300"))
+
+_NO_MATCH = 1 << 62
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    category_id: int
+    category_name: Optional[str]
+
+
+class RuleMatcher:
+    """Aho-Corasick automaton over all category rule patterns.
+
+    Rules are given in priority order; when several patterns occur in a text the
+    one that comes first wins, same as the old loop that returned on the first
+    `rule.pattern in text`.
+    """
+
+    def __init__(self, rules: Iterable[tuple[str, int, Optional[str]]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._best: list[int] = [_NO_MATCH]
+        self._results: list[RuleMatch] = []
+
+        for priority, (pattern, category_id, category_name) in enumerate(rules):
+            self._results.append(RuleMatch(category_id, category_name))
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(_NO_MATCH)
+                node = nxt
+            if priority < self._best[node]:
+                self._best[node] = priority
+
+        # breadth-first pass: fail links plus the best rule reachable via suffixes
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                if self._best[self._fail[child]] < self._best[child]:
+                    self._best[child] = self._best[self._fail[child]]
+                queue.append(child)
+        # the root may carry an empty pattern, which matches every text
+        for node in range(1, len(self._best)):
+            if self._best[0] < self._best[node]:
+                self._best[node] = self._best[0]
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def match(self, text: str) -> Optional[RuleMatch]:
+        goto = self._goto
+        fail = self._fail
+        best = self._best
+        node = 0
+        found = best[0]
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best[node] < found:
+                found = best[node]
+                if found == 0:
+                    break
+        if found == _NO_MATCH:
+            return None
+        return self._results[found]
+
+    def categorize(self, item_name: str, merchant: Optional[str]) -> Optional[RuleMatch]:
+        return self.match(f"{item_name} {merchant or ''}".lower())
+
+    def categorize_many(
+        self, item_names: Sequence[str], merchant: Optional[str]
+    ) -> list[Optional[RuleMatch]]:
+        suffix = f" {merchant or ''}".lower()
+        return [self.match(name.lower() + suffix) for name in item_names]
+
+
+_lock = threading.Lock()
+_generation = 0
+_cached: Optional[RuleMatcher] = None
+_cached_version: Optional[tuple] = None
+_cached_at = 0.0
+
+
+def invalidate() -> None:
+    """Force the next `get_matcher` call to recompile the rules."""
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def load_rules(session: Session) -> list[tuple[str, int, Optional[str]]]:
+    stmt = (
+        select(models.CategoryRule.pattern, models.CategoryRule.category_id, models.Category.name)
+        .join(models.Category, models.CategoryRule.category_id == models.Category.id)
+        .order_by(models.CategoryRule.id)
+    )
+    return [tuple(row) for row in session.execute(stmt).all()]
+
+
+def _rules_version(session: Session) -> tuple:
+    count, max_id = session.execute(
+        select(func.count(models.CategoryRule.id), func.max(models.CategoryRule.id))
+    ).one()
+    return (_generation, count, max_id)
+
+
+def get_matcher(session: Session) -> RuleMatcher:
+    global _cached, _cached_version, _cached_at
+    version = _rules_version(session)
+    now = time.monotonic()
+    with _lock:
+        if (
+            _cached is not None
+            and _cached_version == version
+            and now - _cached_at < RULES_CACHE_TTL
+        ):
+            return _cached
+
+    matcher = RuleMatcher(load_rules(session))
+    with _lock:
+        _cached, _cached_version, _cached_at = matcher, version, now
+    return matcher
@@ -0,0 +1,171 @@
+import argparse
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+from database import session_scope
+
+
+def _rollup_rebuild(args: argparse.Namespace) -> None:
+    import rollup
+
+    with session_scope() as session:
+        rows = rollup.rebuild(session)
+    print(f"monthly_category_totals: {rows} rows rebuilt")
+
+
+def _export(args: argparse.Namespace) -> None:
+    import export
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export.stream_export(
+            args.format, date_from=args.date_from, date_to=args.date_to
+        ):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+def _import(args: argparse.Namespace) -> None:
+    import importer
+
+    importer.run_import(
+        args.path, workers=args.workers, batch_size=args.batch_size, source=args.source
+    )
+
+
+def _recategorize(args: argparse.Namespace) -> None:
+    import recategorize
+
+    state = recategorize.run(
+        date_from=args.date_from,
+        date_to=args.date_to,
+        batch_size=args.batch_size,
+        checkpoint=args.checkpoint,
+        resume=args.resume,
+    )
+    print(f"done: {state['scanned']} items scanned, {state['changed']} changed")
+
+
+def _partitions(args: argparse.Namespace) -> None:
+    import partitioning
+    import services
+    from database import engine
+
+    dropped = None
+    with engine.begin() as connection:
+        if args.action == "ensure":
+            months_ahead = args.months_ahead
+            if months_ahead is None:
+                months_ahead = partitioning.PARTITION_MONTHS_AHEAD
+            created = partitioning.ensure(connection, months_ahead=months_ahead)
+            print(f"created: {', '.join(created) or 'none'}")
+        elif args.action == "drop":
+            dropped = partitioning.drop_before(connection, args.before)
+        else:
+            for name in partitioning.partitions(connection):
+                print(name)
+    if dropped is not None:
+        # only once committed, or readers could cache the old rows again
+        services.receipts_deleted()
+        print(
+            f"dropped: {', '.join(dropped['partitions']) or 'no partitions'},"
+            f" {dropped['receipts']} receipts"
+        )
+
+
+def _month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def _worker(args: argparse.Namespace) -> None:
+    import asyncio
+    import signal
+
+    import fs_client
+    import jobs
+
+    async def serve() -> None:
+        await fs_client.startup()
+        pool = jobs.WorkerPool(args.concurrency)
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, pool.stop.set)
+        pool.start()
+        print(f"{args.concurrency} ingest workers running, Ctrl+C to stop", file=sys.stderr)
+        try:
+            await pool.stop.wait()
+        finally:
+            await pool.shutdown()
+            await fs_client.shutdown()
+
+    asyncio.run(serve())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Receipt Analyzer maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rollup_parser = commands.add_parser("rollup", help="monthly /stats rollup table")
+    rollup_commands = rollup_parser.add_subparsers(dest="action", required=True)
+    rebuild = rollup_commands.add_parser("rebuild", help="recompute the rollup from items")
+    rebuild.set_defaults(func=_rollup_rebuild)
+
+    export_parser = commands.add_parser("export", help="stream receipts with items")
+    export_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    export_parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat)
+    export_parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat)
+    export_parser.add_argument("--output", "-o", help="file path, stdout by default")
+    export_parser.set_defaults(func=_export)
+
+    import_parser = commands.add_parser(
+        "import", help="load archived FS payloads (.json files, NDJSON or a directory)"
+    )
+    import_parser.add_argument("path", type=Path)
+    import_parser.add_argument("--workers", type=int, help="processes, CPU count by default")
+    import_parser.add_argument("--batch-size", type=int, default=2000, help="receipts per commit")
+    import_parser.add_argument("--source", default="import")
+    import_parser.set_defaults(func=_import)
+
+    recategorize_parser = commands.add_parser(
+        "recategorize", help="re-apply category rules to stored items"
+    )
+    recategorize_parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat)
+    recategorize_parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat)
+    recategorize_parser.add_argument("--batch-size", type=int, default=5000)
+    recategorize_parser.add_argument(
+        "--checkpoint", type=Path, default=Path("recategorize.checkpoint.json")
+    )
+    recategorize_parser.add_argument(
+        "--resume", action="store_true", help="continue after the last saved batch"
+    )
+    recategorize_parser.set_defaults(func=_recategorize)
+
+    worker_parser = commands.add_parser(
+        "worker", help="work off queued POST /receipts/fetch?mode=async jobs"
+    )
+    worker_parser.add_argument("--concurrency", type=int, default=8, help="jobs in flight")
+    worker_parser.set_defaults(func=_worker)
+
+    partitions_parser = commands.add_parser("partitions", help="monthly partitions of items")
+    partitions_commands = partitions_parser.add_subparsers(dest="action", required=True)
+    ensure = partitions_commands.add_parser(
+        "ensure", help="create the partitions of the coming months (run monthly from cron)"
+    )
+    ensure.add_argument("--months-ahead", type=int, help="PARTITION_MONTHS_AHEAD by default")
+    ensure.set_defaults(func=_partitions)
+    partitions_commands.add_parser("list", help="list partitions").set_defaults(func=_partitions)
+    drop = partitions_commands.add_parser(
+        "drop", help="drop receipts, items and rollup rows older than a month"
+    )
+    drop.add_argument("--before", type=_month, required=True, help="YYYY-MM, kept")
+    drop.set_defaults(func=_partitions)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
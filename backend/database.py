@@ -1,11 +1,19 @@
 import os
 from contextlib import contextmanager
-from typing import Iterator
+from datetime import timezone, tzinfo
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
 
 
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
 def _load_database_url() -> str:
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
@@ -13,12 +21,27 @@ def _load_database_url() -> str:
     return db_url
 
 
+def _load_async_database_url(db_url: str) -> str:
+    async_url = os.getenv("ASYNC_DATABASE_URL")
+    if async_url:
+        return async_url
+    return make_url(db_url).set(drivername="postgresql+asyncpg").render_as_string(
+        hide_password=False
+    )
+
+
 DATABASE_URL = _load_database_url()
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(
     bind=engine, autoflush=False, autocommit=False, expire_on_commit=False
 )
 
+ASYNC_DATABASE_URL = _load_async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 class Base(DeclarativeBase):
     pass
@@ -32,6 +55,11 @@ def get_db() -> Iterator[Session]:
         db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 @contextmanager
 def session_scope() -> Iterator[Session]:
     session = SessionLocal()
@@ -45,11 +73,46 @@ def session_scope() -> Iterator[Session]:
         session.close()
 
 
+@lru_cache(maxsize=1)
+def session_time_zone() -> tzinfo:
+    """Time zone Postgres reads naive timestamps in (its `TimeZone` setting).
+
+    Names zoneinfo does not know (POSIX offsets) fall back to UTC.
+    """
+    with engine.connect() as connection:
+        name = connection.execute(text("SHOW TimeZone")).scalar()
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
 def init_db() -> None:
     """Create tables and seed default categories/rules."""
     import models  # import here to avoid circular deps
+    import partitioning
+
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        partitioning.ensure(connection)
     from seed import seed_reference_data
 
     with session_scope() as session:
         seed_reference_data(session)
+
+
+def check_schema() -> Optional[str]:
+    """Compare the Alembic revision of the database with the migration head.
+
+    Returns None when they match, otherwise a description of the mismatch.
+    Reads only the migration scripts and the `alembic_version` table.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory(str(MIGRATIONS_DIR)).get_heads())
+    with engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    if current != heads:
+        return f"database at {sorted(current) or 'no revision'}, code expects {sorted(heads)}"
+    return None
@@ -0,0 +1,94 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+# receipts registered online carry their FS id in the QR code
+_RECEIPT_ID = re.compile(r"O-[0-9A-F]{32}", re.IGNORECASE)
+# receipts issued offline: OKP:cash register code:yyMMddHHmmss:number:total
+_OKP = re.compile(r"[0-9A-F]{8}(?:-?[0-9A-F]{8}){4}", re.IGNORECASE)
+_OFFLINE = re.compile(
+    r"(?P<okp>[0-9A-F-]{40,44}):(?P<register>\d+):(?P<issued>\d{12}):(?P<number>\d+):(?P<total>-?\d+(?:[.,]\d+)?)",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class ReceiptKey:
+    """Canonical identity of a receipt known before asking FS.
+
+    `kind` is "id" (value = FS receiptId) or "okp" (value = the OKP
+    signature code, which FS returns as `receipt.okp`). The offline form
+    also carries the printed cash register code, time, number and total.
+    """
+
+    kind: str
+    value: str
+    cash_register_code: Optional[str] = None
+    issued_at: Optional[datetime] = None
+    number: Optional[int] = None
+    total: Optional[Decimal] = None
+
+
+def normalize_okp(value: Any) -> Optional[str]:
+    """OKP as five dash-separated groups of 8 upper-case hex digits, None if malformed."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if not _OKP.fullmatch(value):
+        return None
+    digits = value.replace("-", "").upper()
+    return "-".join(digits[start : start + 8] for start in range(0, 40, 8))
+
+
+def parse_qr(text: Optional[str]) -> Optional[ReceiptKey]:
+    """Key of an eKasa QR code string, None for anything else (FS decides)."""
+    if not text:
+        return None
+    text = text.strip()
+    if _RECEIPT_ID.fullmatch(text):
+        return ReceiptKey("id", text.upper())
+    match = _OFFLINE.fullmatch(text)
+    if match is None:
+        return None
+    okp = normalize_okp(match["okp"])
+    if okp is None:
+        return None
+    issued = match["issued"]
+    try:
+        # yyMMddHHmmss; strptime is several times slower
+        issued_at = datetime(
+            2000 + int(issued[:2]),
+            int(issued[2:4]),
+            int(issued[4:6]),
+            int(issued[6:8]),
+            int(issued[8:10]),
+            int(issued[10:]),
+        )
+    except ValueError:
+        return None
+    return ReceiptKey(
+        "okp",
+        okp,
+        cash_register_code=match["register"],
+        issued_at=issued_at,
+        number=int(match["number"]),
+        total=Decimal(match["total"].replace(",", ".")),
+    )
+
+
+def receipt_key(receipt_id: Optional[str], qr_code: Optional[str]) -> Optional[ReceiptKey]:
+    """Key of a fetch request: the given receipt_id as is (online ids upper-cased), else its QR code."""
+    if receipt_id and receipt_id.strip():
+        receipt_id = receipt_id.strip()
+        if _RECEIPT_ID.fullmatch(receipt_id):
+            receipt_id = receipt_id.upper()
+        return ReceiptKey("id", receipt_id)
+    return parse_qr(qr_code)
+
+
+def payload_okp(payload: dict[str, Any]) -> Optional[str]:
+    """Normalized OKP of a raw FS payload, if it has one."""
+    receipt = payload.get("receipt") or payload
+    return normalize_okp(receipt.get("okp")) if isinstance(receipt, dict) else None
@@ -0,0 +1,166 @@
+import csv
+import io
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+import models
+import partitioning
+import serialization
+from database import SessionLocal
+
+EXPORT_BATCH_SIZE = 2000
+
+CSV_COLUMNS = [
+    "receipt_id",
+    "issue_date",
+    "merchant_name",
+    "total_amount",
+    "source",
+    "item_id",
+    "item_name",
+    "quantity",
+    "unit_price",
+    "total_price",
+    "category",
+    "suggested_category",
+]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _export_rows(
+    session: Session,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    batch_size: int,
+) -> Iterator[tuple]:
+    """One row per item (or per item-less receipt), receipts kept contiguous.
+
+    Rows come from a server-side cursor, so memory use does not grow with the
+    size of the export.
+    """
+    receipt, item = models.Receipt, models.Item
+    stmt = (
+        select(
+            receipt.receipt_id,
+            receipt.issue_date,
+            receipt.merchant_name,
+            receipt.total_amount,
+            receipt.source,
+            item.id,
+            item.name,
+            item.quantity,
+            item.unit_price,
+            item.total_price,
+            models.Category.name,
+            item.suggested_category,
+        )
+        .select_from(receipt)
+        .outerjoin(
+            item,
+            and_(
+                item.receipt_id == receipt.id,
+                item.partition_date == receipt.partition_date,
+                *partitioning.prune(item.partition_date, date_from, date_to),
+            ),
+        )
+        .outerjoin(models.Category, item.category_id == models.Category.id)
+        .order_by(receipt.issue_date, receipt.id, item.id)
+    )
+    if date_from is not None:
+        stmt = stmt.where(receipt.issue_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(receipt.issue_date < date_to)
+    result = session.execute(
+        stmt.execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for partition in result.partitions():
+        yield from partition
+
+
+def iter_ndjson(
+    session: Session,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """One JSON object per receipt with its items nested, one per line."""
+    buffer: list[bytes] = []
+    flush_at = 1  # send the first receipt right away, then whole batches
+    current: Optional[dict] = None
+    current_key = None
+    for row in _export_rows(session, date_from, date_to, batch_size):
+        if row[0] != current_key:
+            if current is not None:
+                buffer.append(serialization.dumps(current, utc_z=False))
+                if len(buffer) >= flush_at:
+                    yield b"\n".join(buffer) + b"\n"
+                    buffer = []
+                    flush_at = batch_size
+            current_key = row[0]
+            current = {
+                "receipt_id": row[0],
+                "issue_date": row[1],
+                "merchant_name": row[2],
+                "total_amount": row[3],
+                "source": row[4],
+                "items": [],
+            }
+        if row[5] is not None:
+            current["items"].append(
+                {
+                    "id": row[5],
+                    "name": row[6],
+                    "quantity": row[7],
+                    "unit_price": row[8],
+                    "total_price": row[9],
+                    "category": row[10],
+                    "suggested_category": row[11],
+                }
+            )
+    if current is not None:
+        buffer.append(serialization.dumps(current, utc_z=False))
+    if buffer:
+        yield b"\n".join(buffer) + b"\n"
+
+
+def iter_csv(
+    session: Session,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """One CSV line per item, receipt columns repeated."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_COLUMNS)
+    yield out.getvalue().encode()
+    out.seek(0)
+    out.truncate()
+    rows = 0
+    for row in _export_rows(session, date_from, date_to, batch_size):
+        issue_date = row[1].isoformat() if row[1] else None
+        writer.writerow((row[0], issue_date, *row[2:]))
+        rows += 1
+        if rows % batch_size == 0:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+
+def stream_export(
+    fmt: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Export chunks read within a session owned by the generator itself, so it
+    can outlive the request handler that returned the streaming response."""
+    iterate = iter_ndjson if fmt == "ndjson" else iter_csv
+    with SessionLocal() as session:
+        yield from iterate(session, date_from, date_to, batch_size)
@@ -0,0 +1,167 @@
+import asyncio
+import importlib.util
+import os
+import random
+import time
+from typing import Any, Optional
+
+import httpx
+
+import metrics
+
+FS_API_URL = os.getenv(
+    "FS_API_URL", "https://ekasa.financnasprava.sk/mdu/api/v1/opd/receipt/find"
+)
+FS_TIMEOUT = float(os.getenv("FS_TIMEOUT", "15"))
+FS_MAX_RETRIES = int(os.getenv("FS_MAX_RETRIES", "2"))
+FS_BACKOFF_BASE = float(os.getenv("FS_BACKOFF_BASE", "0.2"))
+FS_BACKOFF_MAX = float(os.getenv("FS_BACKOFF_MAX", "2"))
+FS_POOL_SIZE = int(os.getenv("FS_POOL_SIZE", "20"))
+FS_HTTP2 = os.getenv("FS_HTTP2", "0") == "1"
+FS_BREAKER_THRESHOLD = int(os.getenv("FS_BREAKER_THRESHOLD", "5"))
+FS_BREAKER_RESET = float(os.getenv("FS_BREAKER_RESET", "30"))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failed calls, lets one probe through
+    after `reset_timeout` seconds and closes again when that probe succeeds."""
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            raise CircuitOpenError("FS API circuit breaker is open")
+        if state == "half_open":
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_abandoned(self) -> None:
+        """The call ended without telling anything about FS (cancelled); the
+        next call may probe instead."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def _is_transient(response: httpx.Response) -> bool:
+    return response.status_code >= 500
+
+
+class FSClient:
+    def __init__(
+        self,
+        url: str = FS_API_URL,
+        timeout: float = FS_TIMEOUT,
+        max_retries: int = FS_MAX_RETRIES,
+        pool_size: int = FS_POOL_SIZE,
+        http2: bool = FS_HTTP2,
+    ):
+        self.url = url
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker(FS_BREAKER_THRESHOLD, FS_BREAKER_RESET)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            # HTTP/2 needs the optional `h2` package (httpx[http2])
+            http2=http2 and importlib.util.find_spec("h2") is not None,
+        )
+
+    async def find(self, payload: dict[str, Any]) -> httpx.Response:
+        """POST a lookup to FS, retrying 5xx answers and transport errors.
+
+        The last response or transport error is passed on to the caller once
+        the retries are used up.
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            metrics.FS_RESPONSES.inc("circuit_open")
+            raise
+        try:
+            return await self._find(payload)
+        except asyncio.CancelledError:
+            self.breaker.record_abandoned()
+            raise
+        except BaseException:
+            # transport errors past the retries and anything else httpx raises
+            # (decoding, protocol errors); a half-open probe must end either way
+            self.breaker.record_failure()
+            raise
+
+    async def _find(self, payload: dict[str, Any]) -> httpx.Response:
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await self._client.post(self.url, json=payload)
+            except httpx.TransportError:
+                metrics.FS_REQUEST_DURATION.observe(time.perf_counter() - started, "error")
+                metrics.FS_RESPONSES.inc("error")
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                metrics.FS_REQUEST_DURATION.observe(
+                    time.perf_counter() - started, "error" if _is_transient(response) else "ok"
+                )
+                metrics.FS_RESPONSES.inc(response.status_code)
+                if not _is_transient(response):
+                    self.breaker.record_success()
+                    return response
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    return response
+            delay = min(FS_BACKOFF_MAX, FS_BACKOFF_BASE * 2**attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_client: Optional[FSClient] = None
+
+
+def get_client() -> FSClient:
+    global _client
+    if _client is None:
+        _client = FSClient()
+    return _client
+
+
+async def startup() -> None:
+    get_client()
+
+
+async def shutdown() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
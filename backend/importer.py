@@ -0,0 +1,173 @@
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from datetime import tzinfo
+from typing import Iterator, Optional, TextIO
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+import categorizer
+import services
+from database import SessionLocal, engine, session_time_zone
+
+IMPORT_CHUNK_SIZE = 200
+IMPORT_BATCH_SIZE = 2000
+
+_matcher: Optional[categorizer.RuleMatcher] = None
+_time_zone: Optional[tzinfo] = None
+
+
+def iter_documents(path: Path) -> Iterator[str]:
+    """Raw JSON texts from a .json file, an NDJSON file or a directory of both."""
+    if path.is_dir():
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith((".json", ".ndjson", ".jsonl")):
+                    yield from iter_documents(Path(root) / name)
+        return
+    with path.open(encoding="utf-8") as handle:
+        if path.suffix in (".ndjson", ".jsonl"):
+            for line in handle:
+                if line.strip():
+                    yield line
+        else:
+            yield handle.read()
+
+
+def _init_worker(rules: list[tuple], time_zone: tzinfo) -> None:
+    global _matcher, _time_zone
+    # the forked pool holds the parent's connections; leave them to the parent
+    engine.dispose(close=False)
+    _matcher = categorizer.RuleMatcher(rules)
+    _time_zone = time_zone
+
+
+def _prepare_chunk(documents: list[str], source: str) -> tuple[list, list[str]]:
+    prepared: list[services.PreparedReceipt] = []
+    errors: list[str] = []
+    for document in documents:
+        try:
+            parsed = json.loads(document)
+        except ValueError as exc:
+            errors.append(f"invalid JSON: {exc}")
+            continue
+        for payload in parsed if isinstance(parsed, list) else [parsed]:
+            try:
+                prepared.append(services.prepare_receipt(payload, source, _matcher, time_zone=_time_zone))
+            except (ValueError, TypeError, AttributeError) as exc:
+                errors.append(str(exc))
+    return prepared, errors
+
+
+class _Progress:
+    def __init__(self, out: TextIO):
+        self.out = out
+        self.started = time.perf_counter()
+        self.receipts = 0
+        self.items = 0
+        self.created = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    def report(self, final: bool = False) -> None:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(
+            f"{'done' if final else 'progress'}: {self.receipts} receipts"
+            f" ({self.created} new, {self.duplicates} existing, {self.errors} errors),"
+            f" {self.items} items in {elapsed:.1f} s"
+            f" = {self.receipts / elapsed:.0f} receipts/s, {self.items / elapsed:.0f} items/s"
+            f" ({self.items / elapsed * 3600 / 1e6:.2f} M items/h)",
+            file=self.out,
+            flush=True,
+        )
+
+
+def run_import(
+    path: Path,
+    workers: Optional[int] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    source: str = "import",
+    out: TextIO = sys.stderr,
+) -> _Progress:
+    """Normalize and categorize payloads in a process pool and write them in
+    batches of `batch_size` receipts; receipt_ids already stored are skipped."""
+    workers = workers or os.cpu_count() or 1
+    with SessionLocal() as session:
+        rules = categorizer.load_rules(session)
+    time_zone = session_time_zone()
+
+    progress = _Progress(out)
+    pending: list[services.PreparedReceipt] = []
+
+    def flush(session) -> None:
+        if not pending:
+            return
+        groups = [list(pending)]
+        while groups:
+            group = groups.pop()
+            try:
+                result = services.insert_prepared(session, group)
+                session.commit()
+            except (DataError, IntegrityError) as exc:
+                session.rollback()
+                if len(group) > 1:
+                    # a value the columns reject (e.g. a name over 255 characters):
+                    # halve the batch until only its receipt is skipped
+                    middle = len(group) // 2
+                    groups += [group[middle:], group[:middle]]
+                    continue
+                progress.errors += 1
+                print(f"skipped {group[0].receipt['receipt_id']}: {exc.orig}", file=out)
+                continue
+            services.receipts_persisted(result)
+            progress.items += sum(
+                len(entry.items) for entry in group if entry.receipt["receipt_id"] in result.created
+            )
+            progress.created += len(result.created)
+            progress.duplicates += len(result.duplicates)
+        progress.receipts += len(pending)
+        pending.clear()
+        progress.report()
+
+    def chunks() -> Iterator[list[str]]:
+        chunk: list[str] = []
+        for document in iter_documents(path):
+            chunk.append(document)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(rules, time_zone)
+    ) as pool, SessionLocal() as session:
+        in_flight: deque[Future] = deque()
+        source_chunks = chunks()
+        exhausted = False
+        while in_flight or not exhausted:
+            # keep a bounded window of chunks in the pool so memory stays flat
+            while not exhausted and len(in_flight) < workers * 2:
+                chunk = next(source_chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    in_flight.append(pool.submit(_prepare_chunk, chunk, source))
+            if not in_flight:
+                break
+            prepared, errors = in_flight.popleft().result()
+            pending.extend(prepared)
+            progress.errors += len(errors)
+            for error in errors[:3]:
+                print(f"skipped: {error}", file=out)
+            if len(pending) >= batch_size:
+                flush(session)
+        flush(session)
+
+    progress.report(final=True)
+    return progress
@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+import weakref
+from datetime import timedelta
+from typing import Any, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+import ekasa
+import metrics
+import models
+import services
+from database import AsyncSessionLocal
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "2"))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "300"))
+# a running job whose worker died is claimed again after this many seconds
+JOB_LEASE = float(os.getenv("JOB_LEASE", "120"))
+JOB_MAX_WAIT = 30.0
+
+FINISHED = ("done", "failed")
+
+logger = logging.getLogger(__name__)
+
+JOBS_PROCESSED = metrics.Counter(
+    "ingest_jobs_processed",
+    "Ingestion job attempts by outcome (done, retry, failed).",
+    ("outcome",),
+)
+JOB_QUEUE_DELAY = metrics.Histogram(
+    "ingest_job_queue_seconds",
+    "Time from a job becoming runnable to a worker claiming it.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+class _Wakeups:
+    """In-process wake-ups of the workers and waiters on one event loop;
+    those in other processes (or loops) fall back to polling."""
+
+    def __init__(self):
+        self.enqueued = asyncio.Event()
+        self.finished = asyncio.Event()
+
+
+# asyncio events must only be awaited on one loop, so there is a set per loop
+_wakeups: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Wakeups]" = weakref.WeakKeyDictionary()
+
+
+def _loop_wakeups() -> Optional[_Wakeups]:
+    """Wake-ups of the running event loop, None outside of one."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    wakeups = _wakeups.get(loop)
+    if wakeups is None:
+        wakeups = _wakeups[loop] = _Wakeups()
+    return wakeups
+
+
+def _notify_finished() -> None:
+    wakeups = _loop_wakeups()
+    event, wakeups.finished = wakeups.finished, asyncio.Event()
+    event.set()
+
+
+def enqueue(session: Session, request: dict[str, Any]) -> models.IngestJob:
+    """Store a fetch request (receipt_id / qr_code / payload) as a queued job and commit."""
+    job = models.IngestJob(status="queued", request=request, attempts=0)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    wakeups = _loop_wakeups()
+    if wakeups is not None:
+        wakeups.enqueued.set()
+    return job
+
+
+def claim(session: Session, worker: str) -> Optional[models.IngestJob]:
+    """Lock the oldest runnable job for `worker` and mark it running.
+
+    `FOR UPDATE SKIP LOCKED` lets any number of workers claim concurrently
+    without waiting on each other's rows. Running jobs whose lease expired
+    (the worker died) are claimed again, or failed once they used up
+    JOB_MAX_ATTEMPTS.
+    """
+    job_table = models.IngestJob
+    expired = and_(
+        job_table.status == "running",
+        job_table.locked_at < func.now() - timedelta(seconds=JOB_LEASE),
+    )
+    # jobs whose worker died JOB_MAX_ATTEMPTS times (a crash they cause) are not run again
+    session.execute(
+        update(job_table)
+        .where(expired, job_table.attempts >= JOB_MAX_ATTEMPTS)
+        .values(
+            status="failed",
+            status_code=500,
+            detail="Spracovanie úlohy opakovane nedobehlo",
+            locked_by=None,
+            locked_at=None,
+            updated_at=func.now(),
+            finished_at=func.now(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    runnable = (
+        select(job_table.id)
+        .where(
+            or_(
+                and_(job_table.status == "queued", job_table.run_after <= func.now()),
+                and_(expired, job_table.attempts < JOB_MAX_ATTEMPTS),
+            )
+        )
+        .order_by(job_table.run_after)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(job_table)
+        .where(job_table.id == runnable)
+        .values(
+            status="running",
+            attempts=job_table.attempts + 1,
+            locked_by=worker,
+            locked_at=func.now(),
+            updated_at=func.now(),
+        )
+        .returning(job_table)
+        .execution_options(synchronize_session=False)
+    )
+    job = session.execute(stmt).scalar_one_or_none()
+    session.commit()
+    return job
+
+
+def _release(session: Session, job_id: uuid.UUID, worker: str, **values: Any) -> None:
+    # a worker whose lease expired and was taken over must not overwrite the new owner
+    session.execute(
+        update(models.IngestJob)
+        .where(models.IngestJob.id == job_id, models.IngestJob.locked_by == worker)
+        .values(locked_by=None, locked_at=None, updated_at=func.now(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+
+def complete(session: Session, job: models.IngestJob, worker: str, receipt_id: str, created: bool) -> None:
+    _release(
+        session,
+        job.id,
+        worker,
+        status="done",
+        receipt_id=receipt_id,
+        status_code=201 if created else 200,
+        detail=None,
+        finished_at=func.now(),
+    )
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: half to all of base * 2^(attempts-1), capped."""
+    delay = min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** max(attempts - 1, 0))
+    return random.uniform(delay / 2, delay)
+
+
+def fail(
+    session: Session, job: models.IngestJob, worker: str, status_code: int, detail: str, retryable: bool
+) -> str:
+    """Requeue the job with backoff, or fail it for good; returns the outcome."""
+    if retryable and job.attempts < JOB_MAX_ATTEMPTS:
+        _release(
+            session,
+            job.id,
+            worker,
+            status="queued",
+            status_code=status_code,
+            detail=detail,
+            run_after=func.now() + timedelta(seconds=retry_delay(job.attempts)),
+        )
+        return "retry"
+    _release(
+        session,
+        job.id,
+        worker,
+        status="failed",
+        status_code=status_code,
+        detail=detail,
+        finished_at=func.now(),
+    )
+    return "failed"
+
+
+def _retryable(status_code: int) -> bool:
+    # FS overloaded/unavailable; 4xx answers (not found, bad QR code) stay as they are
+    return status_code >= 500 or status_code == 429
+
+
+async def process(job: models.IngestJob, worker: str) -> str:
+    """Fetch and persist one claimed job; returns done, retry or failed."""
+    request = job.request
+    payload = request.get("payload")
+    source = "manual"
+    known = None
+    try:
+        key = None if payload else ekasa.receipt_key(request.get("receipt_id"), request.get("qr_code"))
+        if key is not None:
+            # already stored: no FS call
+            async with AsyncSessionLocal() as session:
+                known = await session.run_sync(services.find_known_receipt, key)
+        if known is None and not payload:
+            payload = await services.fetch_receipt_from_fs(
+                receipt_id=request.get("receipt_id"), qr_code=request.get("qr_code")
+            )
+            source = "fs"
+        if known is None:
+            async with AsyncSessionLocal() as session:
+                result = await session.run_sync(services.persist_receipts_bulk, [(payload, source)])
+    except services.ReceiptFetchError as exc:
+        error = (exc.status_code, exc.detail, _retryable(exc.status_code))
+    except ValueError as exc:
+        error = (422, str(exc), False)
+    except DBAPIError as exc:
+        status_code = services.rejected_status(exc)
+        if status_code is None:
+            logger.exception("ingest job %s failed", job.id)
+            error = (500, str(exc.orig), True)
+        else:
+            # values or constraints the database rejects: the same payload would fail again
+            error = (status_code, str(exc.orig), False)
+    except Exception as exc:
+        # database hiccups and the like: try again later
+        logger.exception("ingest job %s failed", job.id)
+        error = (500, str(exc) or type(exc).__name__, True)
+    else:
+        if known is not None:
+            receipt_id, created = known, False
+        else:
+            receipt_id = next(iter(result.created), None) or result.duplicates[0]
+            created = bool(result.created)
+        async with AsyncSessionLocal() as session:
+            await session.run_sync(complete, job, worker, receipt_id, created)
+        return "done"
+    async with AsyncSessionLocal() as session:
+        return await session.run_sync(fail, job, worker, *error)
+
+
+async def run_once(worker: str) -> bool:
+    """Claim and process one job; False when the queue had nothing runnable."""
+    async with AsyncSessionLocal() as session:
+        job = await session.run_sync(claim, worker)
+    if job is None:
+        return False
+    JOB_QUEUE_DELAY.observe(max((job.locked_at - job.run_after).total_seconds(), 0.0))
+    outcome = await process(job, worker)
+    JOBS_PROCESSED.inc(outcome)
+    _notify_finished()
+    return True
+
+
+async def run_worker(worker: str, stop: asyncio.Event) -> None:
+    """Work off jobs until `stop` is set; the current job is always finished first."""
+    enqueued = _loop_wakeups().enqueued
+    while not stop.is_set():
+        # cleared before looking, so a job enqueued meanwhile is not slept through
+        enqueued.clear()
+        try:
+            busy = await run_once(worker)
+        except Exception:
+            logger.exception("ingest worker %s: claiming a job failed", worker)
+            busy = False
+        if busy:
+            continue
+        try:
+            await asyncio.wait_for(enqueued.wait(), timeout=JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+class WorkerPool:
+    """`count` worker tasks on the running event loop."""
+
+    def __init__(self, count: int, name: Optional[str] = None):
+        prefix = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.names = [f"{prefix}:{index}" for index in range(count)]
+        self.stop = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(run_worker(name, self.stop)) for name in self.names]
+
+    async def shutdown(self, timeout: float = 10.0) -> None:
+        """Let workers finish their current job; jobs still running after
+        `timeout` are cancelled and picked up again once their lease expires."""
+        self.stop.set()
+        _loop_wakeups().enqueued.set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def wait(self) -> None:
+        await asyncio.gather(*self._tasks)
+
+
+async def wait_for(session: Any, job_id: uuid.UUID, timeout: float) -> Optional[models.IngestJob]:
+    """Current state of a job, waiting up to `timeout` seconds for it to finish.
+
+    Jobs finished by a worker in this process wake the waiter at once, the
+    others are noticed by re-reading the row every JOB_POLL_INTERVAL.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(timeout, 0.0), JOB_MAX_WAIT)
+    wakeups = _loop_wakeups()
+    while True:
+        finished = wakeups.finished
+        job = await session.get(models.IngestJob, job_id, populate_existing=True)
+        # do not keep a connection idle in transaction while waiting
+        await session.commit()
+        remaining = deadline - loop.time()
+        if job is None or job.status in FINISHED or remaining <= 0:
+            return job
+        try:
+            await asyncio.wait_for(finished.wait(), timeout=min(remaining, JOB_POLL_INTERVAL))
+        except asyncio.TimeoutError:
+            pass
@@ -1,16 +1,181 @@
+import asyncio
+import logging
 import os
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import Literal, Optional
+from uuid import UUID
 
-from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+import cache
+import ekasa
+import export
+import fs_client
+import jobs
+import metrics
+import profiling
 import schemas
+import serialization
 import services
-from database import engine, get_db, init_db
+from database import SessionLocal, async_engine, check_schema, engine, get_async_db, get_db, init_db
 
-app = FastAPI(title="Receipt Analyzer API")
+# init: create_all + seed on every start (local development, docker-compose)
+# check: only compare the Alembic revision with the code (migrated deployments)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "init").lower()
+HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "5"))
+# how often the notification listener checks its connection, and waits after losing it
+NOTIFY_PING_INTERVAL = 10.0
+NOTIFY_RETRY_DELAY = 5.0
+
+logger = logging.getLogger(__name__)
+
+_probes = cache.TTLCache("health_probes", 8, HEALTH_CACHE_TTL)
+_schema_ok = False
+
+
+def _probe_db() -> Optional[str]:
+    """None if the database answered SELECT 1, else the error; cached for HEALTH_CACHE_TTL."""
+    error = _probes.get("db")
+    if error is cache.MISSING:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            error = None
+        except Exception as exc:
+            error = str(exc)
+        _probes.set("db", error)
+    return error
+
+
+def _probe_schema() -> Optional[str]:
+    """None once the schema revision matched; mismatches are re-checked after the TTL."""
+    global _schema_ok
+    if _schema_ok or STARTUP_MODE != "check":
+        return None
+    error = _probes.get("schema")
+    if error is cache.MISSING:
+        try:
+            error = check_schema()
+        except Exception as exc:
+            error = str(exc)
+        _probes.set("schema", error)
+        _schema_ok = error is None
+    return error
+
+
+def _load_known_receipts(stop: threading.Event) -> None:
+    try:
+        with SessionLocal() as session:
+            count = services.load_known_receipts(session, stop)
+    except Exception:
+        logger.exception("loading the known receipts filter failed")
+    else:
+        if count is not None:
+            logger.info("known receipts filter loaded: %d receipts", count)
+
+
+async def _start_workers(workers: jobs.WorkerPool) -> None:
+    # in check mode the queue table may not exist until migrations ran
+    while await asyncio.to_thread(_probe_schema) is not None:
+        await asyncio.sleep(HEALTH_CACHE_TTL)
+    workers.start()
+
+
+async def _listen_notifications() -> None:
+    """LISTEN for what other processes (cli worker, import, recategorize,
+    other API workers) changed: read cache invalidations and inserted
+    receipts for the known receipts filter.
+
+    Notifications sent while not listening are lost, so after every
+    (re)connect the in-process caches are dropped and the filter is loaded
+    again; until then lookups go to the database.
+    """
+    def on_invalidation(connection, pid, channel, payload):
+        services.handle_invalidation(payload)
+
+    def on_known_receipts(connection, pid, channel, payload):
+        services.handle_known_receipts(payload)
+
+    listeners = {
+        services.INVALIDATION_CHANNEL: on_invalidation,
+        services.KNOWN_RECEIPTS_CHANNEL: on_known_receipts,
+    }
+    stop_loading = threading.Event()
+    loading: Optional[asyncio.Task] = None
+    try:
+        while True:
+            try:
+                async with async_engine.connect() as connection:
+                    raw = (await connection.get_raw_connection()).driver_connection
+                    for channel, callback in listeners.items():
+                        await raw.add_listener(channel, callback)
+                    # from here on every commit elsewhere is notified, anything
+                    # older is read by the load
+                    services.apply_invalidation(None)
+                    if loading is not None:
+                        stop_loading.set()
+                        await loading
+                    stop_loading = threading.Event()
+                    loading = asyncio.create_task(asyncio.to_thread(_load_known_receipts, stop_loading))
+                    try:
+                        while True:
+                            await asyncio.sleep(NOTIFY_PING_INTERVAL)
+                            await connection.exec_driver_sql("SELECT 1")
+                    finally:
+                        if not raw.is_closed():
+                            for channel, callback in listeners.items():
+                                await raw.remove_listener(channel, callback)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("notification listener lost its connection")
+            services.suspend_known_receipts()
+            services.apply_invalidation(None)
+            await asyncio.sleep(NOTIFY_RETRY_DELAY)
+    finally:
+        # cancelling would not stop the thread, it checks the flag between chunks
+        stop_loading.set()
+        if loading is not None:
+            await loading
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STARTUP_MODE == "init":
+        init_db()
+    else:
+        _probe_schema()
+    await fs_client.startup()
+    # also loads the known receipts filter; until then every lookup goes to the database
+    listening = asyncio.create_task(_listen_notifications())
+    workers = jobs.WorkerPool(jobs.JOB_WORKERS)
+    starting = asyncio.create_task(_start_workers(workers))
+    try:
+        yield
+    finally:
+        listening.cancel()
+        await asyncio.gather(listening, return_exceptions=True)
+        starting.cancel()
+        await asyncio.gather(starting, return_exceptions=True)
+        await workers.shutdown()
+        await fs_client.shutdown()
+        await async_engine.dispose()
+
+
+app = FastAPI(title="Receipt Analyzer API", lifespan=lifespan)
+
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine.sync_engine, "async")
+if profiling.PROFILE_MODE != "off":
+    profiling.instrument_engine(engine)
+    profiling.instrument_engine(async_engine.sync_engine)
 
 default_origins = [
     "http://localhost:5173",
@@ -28,31 +193,76 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-DB-Query-Count", "X-DB-Time-Ms", "X-Profile-Id"],
 )
-
-
-@app.on_event("startup")
-def startup_event() -> None:
-    init_db()
+if profiling.PROFILE_MODE != "off":
+    app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 @app.get("/health")
 def health():
-    try:
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
+    error = _probe_db()
+    if error is None:
         return {"status": "ok", "db": "connected"}
-    except Exception as exc:
-        return {"status": "error", "db": str(exc)}
+    return {"status": "error", "db": error}
+
 
+@app.get("/ready")
+def ready(response: Response):
+    db_error = _probe_db()
+    schema_error = _probe_schema()
+    if db_error is None and schema_error is None:
+        return {"status": "ready"}
+    response.status_code = 503
+    return {"status": "not_ready", "db": db_error or "connected", "schema": schema_error or "ok"}
 
-@app.post("/receipts/fetch", response_model=schemas.ReceiptDetail)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.all_stats()
+
+
+def _job_response(job, status_code: int = 200) -> Response:
+    body = schemas.JobOut.model_validate(job).model_dump(mode="json")
+    headers = {"Location": f"/jobs/{job.id}"}
+    if job.status not in jobs.FINISHED:
+        headers["Retry-After"] = str(max(1, round(jobs.JOB_POLL_INTERVAL)))
+    return serialization.RawJSONResponse(
+        serialization.dumps(body), status_code=status_code, headers=headers
+    )
+
+
+@app.post(
+    "/receipts/fetch",
+    response_model=schemas.ReceiptDetail,
+    responses={202: {"model": schemas.JobOut, "description": "mode=async: úloha je vo fronte"}},
+)
 async def fetch_receipt_endpoint(
-    request: schemas.ReceiptFetchRequest, db: Session = Depends(get_db)
+    request: schemas.ReceiptFetchRequest,
+    mode: Literal["sync", "async"] = Query(
+        "sync", description="async vráti hneď 202 s úlohou, stav na GET /jobs/{id}"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    if mode == "async":
+        job = await db.run_sync(jobs.enqueue, request.model_dump(exclude_none=True))
+        return _job_response(job, status_code=202)
     payload = request.payload
     source = "manual"
     if not payload:
+        key = ekasa.receipt_key(request.receipt_id, request.qr_code)
+        if key is not None:
+            # already stored: answer without calling FS
+            cached = await db.run_sync(_known_receipt_detail, key)
+            if cached is not None:
+                etag, body = cached
+                return serialization.RawJSONResponse(body, headers={"ETag": etag})
         try:
             payload = await services.fetch_receipt_from_fs(
                 receipt_id=request.receipt_id, qr_code=request.qr_code
@@ -61,24 +271,177 @@ async def fetch_receipt_endpoint(
             raise HTTPException(status_code=exc.status_code, detail=exc.detail)
         source = "fs"
     try:
-        receipt = services.persist_receipt(db, payload=payload, source=source)
+        receipt = await services.persist_receipt_async(db, payload=payload, source=source)
     except services.ReceiptAlreadyExists as exc:
         receipt = exc.receipt
     return schemas.ReceiptDetail.model_validate(receipt)
 
 
+@app.post("/receipts/fetch/batch", response_model=schemas.ReceiptBatchFetchResponse)
+async def fetch_receipts_batch_endpoint(
+    request: schemas.ReceiptBatchFetchRequest, db: AsyncSession = Depends(get_async_db)
+):
+    concurrency = min(
+        request.concurrency or services.FS_FETCH_CONCURRENCY, services.FS_FETCH_CONCURRENCY
+    )
+    results: dict[int, schemas.ReceiptBatchEntryResult] = {}
+    lookups = []
+    to_fetch = [(index, entry) for index, entry in enumerate(request.entries) if not entry.payload]
+    known = await db.run_sync(
+        services.find_known_receipts,
+        [ekasa.receipt_key(entry.receipt_id, entry.qr_code) for _, entry in to_fetch],
+    )
+    for (index, entry), receipt_id in zip(to_fetch, known):
+        if receipt_id is not None:
+            results[index] = schemas.ReceiptBatchEntryResult(
+                index=index, status="exists", status_code=200, receipt_id=receipt_id
+            )
+        else:
+            lookups.append((index, entry))
+    fetched = await services.fetch_many_from_fs(
+        [(entry.receipt_id, entry.qr_code) for _, entry in lookups], concurrency=concurrency
+    )
+
+    to_persist: list[tuple[int, dict, str]] = []
+    for (index, _), outcome in zip(lookups, fetched):
+        if isinstance(outcome, services.ReceiptFetchError):
+            results[index] = schemas.ReceiptBatchEntryResult(
+                index=index, status="failed", status_code=outcome.status_code, detail=outcome.detail
+            )
+        else:
+            to_persist.append((index, outcome, "fs"))
+    to_persist.extend(
+        (index, entry.payload, "manual")
+        for index, entry in enumerate(request.entries)
+        if entry.payload
+    )
+
+    outcomes = await services.persist_receipts_grouped_async(
+        db, [(payload, source) for _, payload, source in to_persist]
+    )
+    for (index, _, _), outcome in zip(to_persist, outcomes):
+        results[index] = schemas.ReceiptBatchEntryResult(
+            index=index,
+            status=outcome.status,
+            status_code=outcome.status_code,
+            receipt_id=outcome.receipt_id,
+            detail=outcome.detail,
+        )
+
+    ordered = [results[index] for index in range(len(request.entries))]
+    return schemas.ReceiptBatchFetchResponse(
+        created=sum(1 for r in ordered if r.status == "created"),
+        existing=sum(1 for r in ordered if r.status == "exists"),
+        failed=sum(1 for r in ordered if r.status == "failed"),
+        results=ordered,
+    )
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobOut)
+async def get_job_endpoint(
+    job_id: UUID,
+    wait: float = Query(
+        0, ge=0, le=jobs.JOB_MAX_WAIT, description="Koľko sekúnd najviac čakať na dokončenie"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+):
+    job = await jobs.wait_for(db, job_id, timeout=wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Úloha neexistuje")
+    return _job_response(job)
+
+
 @app.get("/receipts", response_model=list[schemas.ReceiptOut])
-def list_receipts_endpoint(limit: int = Query(50, le=200), db: Session = Depends(get_db)):
-    receipts = services.list_receipts(db, limit=limit)
-    return [schemas.ReceiptOut.model_validate(r) for r in receipts]
+def list_receipts_endpoint(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Hodnota hlavičky X-Next-Cursor"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    merchant: Optional[str] = Query(None, description="Začiatok názvu obchodníka"),
+    source: Optional[str] = None,
+    min_total: Optional[float] = None,
+    max_total: Optional[float] = None,
+    db: Session = Depends(get_db),
+):
+    key = ("receipts", limit, cursor, date_from, date_to, merchant, source, min_total, max_total)
+    cached = services.read_cache.get(key)
+    if cached is cache.MISSING:
+        snapshot = services.read_cache.snapshot()
+        try:
+            receipts, next_cursor = services.list_receipts(
+                db,
+                limit=limit,
+                cursor=cursor,
+                date_from=date_from,
+                date_to=date_to,
+                merchant=merchant,
+                source=source,
+                min_total=min_total,
+                max_total=max_total,
+            )
+        except services.InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        cached = (serialization.dumps([row._asdict() for row in receipts]), next_cursor)
+        tags = services.receipt_page_tags(cursor, receipts, next_cursor)
+        services.read_cache.set(key, cached, tags, snapshot=snapshot)
+    body, next_cursor = cached
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return serialization.RawJSONResponse(body, headers=headers)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _receipt_detail(db: Session, receipt_id: str) -> Optional[tuple[str, bytes]]:
+    """(ETag, encoded detail) of a stored receipt through the read cache."""
+    key = ("receipt", receipt_id)
+    cached = services.read_cache.get(key)
+    if cached is cache.MISSING:
+        snapshot = services.read_cache.snapshot()
+        etag = services.get_receipt_etag(db, receipt_id=receipt_id)
+        receipt = services.get_receipt_detail(db, receipt_id=receipt_id) if etag else None
+        if receipt is None:
+            return None
+        cached = (etag, serialization.dumps(receipt))
+        services.read_cache.set(key, cached, services.receipt_tags(receipt_id), snapshot=snapshot)
+    return cached
+
 
+def _known_receipt_detail(db: Session, key: ekasa.ReceiptKey) -> Optional[tuple[str, bytes]]:
+    receipt_id = services.find_known_receipt(db, key)
+    return _receipt_detail(db, receipt_id) if receipt_id else None
 
-@app.get("/receipts/{receipt_id}", response_model=schemas.ReceiptDetail)
-def get_receipt_endpoint(receipt_id: str, db: Session = Depends(get_db)):
-    receipt = services.get_receipt(db, receipt_id=receipt_id)
-    if not receipt:
+
+@app.get(
+    "/receipts/{receipt_id}",
+    response_model=schemas.ReceiptDetail,
+    responses={304: {"description": "Bloček sa nezmenil (If-None-Match)"}},
+)
+def get_receipt_endpoint(
+    receipt_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    cached = _receipt_detail(db, receipt_id)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Receipt not found")
-    return schemas.ReceiptDetail.model_validate(receipt)
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return serialization.RawJSONResponse(body, headers=headers)
+
+
+@app.get("/receipts/{receipt_id}/payload")
+def get_receipt_payload_endpoint(receipt_id: str, db: Session = Depends(get_db)):
+    payload = services.get_receipt_payload(db, receipt_id=receipt_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return payload
 
 
 @app.get("/stats", response_model=schemas.StatsResponse)
@@ -87,6 +450,84 @@ def monthly_stats_endpoint(
     month: int = Query(default_factory=lambda: datetime.utcnow().month),
     db: Session = Depends(get_db),
 ):
-    totals = services.monthly_stats(db, year=year, month=month)
-    rows = [schemas.StatsRow(category=cat, total=total) for cat, total in totals]
-    return schemas.StatsResponse(month=month, year=year, totals=rows)
+    key = ("stats", year, month)
+    body = services.read_cache.get(key)
+    if body is cache.MISSING:
+        snapshot = services.read_cache.snapshot()
+        totals = services.monthly_stats(db, year=year, month=month)
+        rows = [{"category": category, "total": total} for category, total in totals]
+        body = serialization.dumps({"month": month, "year": year, "totals": rows})
+        services.read_cache.set(key, body, [services.month_tag(year, month)], snapshot=snapshot)
+    return serialization.RawJSONResponse(body)
+
+
+@app.get("/stats/series", response_model=schemas.SeriesResponse)
+def stats_series_endpoint(
+    start: datetime,
+    end: datetime,
+    granularity: Literal["day", "week", "month", "year"] = "month",
+    group_by: Literal["category", "merchant", "source"] = "category",
+    db: Session = Depends(get_db),
+):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Parameter end musí byť po start")
+    rows = services.stats_series(
+        db, start=start, end=end, granularity=granularity, group_by=group_by
+    )
+    points = [
+        schemas.SeriesPoint(period=period, group=group, total=total, item_count=count)
+        for period, group, total, count in rows
+    ]
+    return schemas.SeriesResponse(
+        start=start,
+        end=end,
+        granularity=granularity,
+        group_by=group_by,
+        total=sum(point.total for point in points),
+        item_count=sum(point.item_count for point in points),
+        points=points,
+    )
+
+
+@app.get("/export")
+def export_endpoint(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    filename = f"receipts.{format}"
+    return StreamingResponse(
+        export.stream_export(format, date_from=date_from, date_to=date_to),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/search", response_model=schemas.SearchResponse)
+def search_endpoint(
+    q: str = Query(..., min_length=2, description="Hľadaný text, napr. mlieko"),
+    target: Literal["item", "merchant"] = "item",
+    mode: Literal["contains", "prefix", "fuzzy"] = "contains",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=0, le=500),
+    db: Session = Depends(get_db),
+):
+    (item_count, receipt_count, total), hits = services.search_items(
+        db,
+        query=q,
+        target=target,
+        mode=mode,
+        date_from=date_from,
+        date_to=date_to,
+        limit=limit,
+    )
+    return schemas.SearchResponse(
+        query=q,
+        target=target,
+        mode=mode,
+        item_count=item_count,
+        receipt_count=receipt_count,
+        total=total,
+        items=[schemas.SearchHit(**hit._asdict()) for hit in hits],
+    )
@@ -0,0 +1,283 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: list[Any] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, *labelvalues: Any, amount: float = 1.0) -> None:
+        self.labels(*labelvalues).inc(amount)
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}_total{_labels(self.labelnames, key)} {_number(child.value)}"
+
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: "_HistogramChild"):
+        self.child = child
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram; bucket bounds are upper-inclusive like Prometheus `le`."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, *labelvalues: Any) -> None:
+        self.labels(*labelvalues).observe(value)
+
+    def time(self, *labelvalues: Any) -> _Timer:
+        return _Timer(self.labels(*labelvalues))
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                le_label = f'le="{le}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Gauge(_Metric):
+    """Gauge read from callbacks at scrape time, one callback per label set."""
+
+    kind = "gauge"
+
+    def set_function(self, fn: Callable[[], float], *labelvalues: Any) -> None:
+        with self._lock:
+            self._children[tuple(str(value) for value in labelvalues)] = fn
+
+    def samples(self) -> Iterable[str]:
+        for key, fn in list(self._children.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(fn())}"
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to the end of the response body, by route template.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed while serving one request.",
+    ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+FS_REQUEST_DURATION = Histogram(
+    "fs_request_duration_seconds",
+    "Latency of single FS API attempts (retries counted separately).",
+    ("outcome",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+FS_RESPONSES = Counter(
+    "fs_responses",
+    "FS API attempts by HTTP status, `error` for transport errors, `circuit_open` for short-circuited calls.",
+    ("status",),
+)
+KNOWN_RECEIPT_LOOKUPS = Counter(
+    "known_receipt_lookups",
+    "Local lookups of fetch requests before FS: hit (stored), filtered (Bloom filter said new), miss.",
+    ("outcome",),
+)
+PERSIST_STAGE_DURATION = Histogram(
+    "receipt_persist_stage_seconds",
+    "Time spent in each stage of fetching and storing receipts.",
+    ("stage",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0),
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool.", ("engine",))
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size (negative while below it).", ("engine",))
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool size.", ("engine",))
+CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Hits per lookup since the start of the process.", ("cache",))
+CACHE_BYTES = Gauge("cache_bytes", "Approximate memory held by the cache (Redis: whole server).", ("cache",))
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts", "Connection checkouts from the pool.", ("engine",))
+
+
+class RequestStats:
+    __slots__ = ("queries",)
+
+    def __init__(self):
+        self.queries = 0
+
+
+# set per request by MetricsMiddleware; sync endpoints see it through the
+# context copied into the threadpool, AsyncSession.run_sync through greenlets
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+def instrument_engine(engine: Any, label: str) -> None:
+    """Count statements per request and expose the pool of a (sync) engine."""
+    pool = engine.pool
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+
+    checkouts = DB_POOL_CHECKOUTS.labels(label)
+
+    @event.listens_for(pool, "checkout")
+    def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.inc()
+
+    if hasattr(pool, "overflow"):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout, label)
+        DB_POOL_OVERFLOW.set_function(pool.overflow, label)
+        DB_POOL_SIZE.set_function(pool.size, label)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request by its route template."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], path, status[0]).observe(elapsed)
+            HTTP_REQUEST_QUERIES.labels(scope["method"], path).observe(stats.queries)
@@ -0,0 +1,35 @@
+"""receipt listing indexes
+
+Revision ID: 5c1d7e9a2b40
+Revises: 08cf38f2f19a
+Create Date: 2026-10-17 10:12:31.482117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d7e9a2b40'
+down_revision: Union[str, None] = '08cf38f2f19a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_receipts_issue_date_id', 'receipts', ['issue_date', 'id'], unique=False)
+    op.create_index(
+        'ix_receipts_merchant_name_lower',
+        'receipts',
+        [sa.text('lower(merchant_name) text_pattern_ops')],
+        unique=False,
+    )
+    op.create_index('ix_items_receipt_id', 'items', ['receipt_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_items_receipt_id', table_name='items')
+    op.drop_index('ix_receipts_merchant_name_lower', table_name='receipts')
+    op.drop_index('ix_receipts_issue_date_id', table_name='receipts')
@@ -0,0 +1,48 @@
+"""monthly category rollup
+
+Revision ID: 9e4a0c6d1f27
+Revises: 5c1d7e9a2b40
+Create Date: 2026-10-17 11:03:54.127604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4a0c6d1f27'
+down_revision: Union[str, None] = '5c1d7e9a2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('monthly_category_totals',
+    sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('month', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('year', 'month', 'category')
+    )
+    op.execute(
+        """
+        INSERT INTO monthly_category_totals (year, month, category, total, item_count)
+        SELECT CAST(EXTRACT(year FROM r.issue_date) AS INTEGER),
+               CAST(EXTRACT(month FROM r.issue_date) AS INTEGER),
+               COALESCE(c.name, COALESCE(i.suggested_category, 'Nezaradené')),
+               COALESCE(SUM(i.total_price), 0.0),
+               COUNT(i.id)
+        FROM items i
+        JOIN receipts r ON i.receipt_id = r.id
+        LEFT OUTER JOIN categories c ON i.category_id = c.id
+        WHERE r.issue_date IS NOT NULL
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('monthly_category_totals')
@@ -0,0 +1,133 @@
+"""partition items by month of the receipt date
+
+Revision ID: a7d3f5b1c946
+Revises: f4a9c2d6e813
+Create Date: 2026-10-17 19:02:11.518344
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f5b1c946'
+down_revision: Union[str, None] = 'f4a9c2d6e813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+ITEM_COLUMNS = (
+    'id, partition_date, receipt_id, name, quantity, unit_price, total_price,'
+    ' category_id, suggested_category'
+)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _item_columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('items_id_seq')"), nullable=False),
+        sa.Column('partition_date', sa.Date(), nullable=False),
+        sa.Column('receipt_id', sa.UUID(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('quantity', sa.Float(), nullable=False),
+        sa.Column('unit_price', sa.Float(), nullable=True),
+        sa.Column('total_price', sa.Float(), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('suggested_category', sa.String(length=100), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
+        sa.ForeignKeyConstraint(['receipt_id'], ['receipts.id']),
+    ]
+
+
+def _create_indexes(trigram: bool) -> None:
+    op.create_index('ix_items_receipt_id', 'items', ['receipt_id'], unique=False)
+    if trigram:
+        op.create_index(
+            'ix_items_name_trgm',
+            'items',
+            ['name'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'},
+        )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    op.add_column('receipts', sa.Column('partition_date', sa.Date(), nullable=True))
+    # partitioning.partition_date: UTC date of issue_date, else of created_at
+    op.execute(
+        "UPDATE receipts SET partition_date ="
+        " (coalesce(issue_date, created_at, now()) AT TIME ZONE 'UTC')::date"
+    )
+    op.alter_column('receipts', 'partition_date', nullable=False)
+
+    # the trigram index needs pg_trgm; recreate it only where it existed
+    trigram = bind.scalar(sa.text("SELECT to_regclass('ix_items_name_trgm')")) is not None
+    op.rename_table('items', 'items_unpartitioned')
+    op.execute('ALTER TABLE items_unpartitioned RENAME CONSTRAINT items_pkey TO items_unpartitioned_pkey')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY NONE')
+
+    op.create_table(
+        'items',
+        *_item_columns(),
+        sa.PrimaryKeyConstraint('id', 'partition_date'),
+        postgresql_partition_by='RANGE (partition_date)',
+    )
+    op.execute('CREATE TABLE items_default PARTITION OF items DEFAULT')
+    # one partition per month that has receipts, plus the coming months
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    months = {_add_months(current, offset) for offset in range(MONTHS_AHEAD + 1)}
+    months.update(
+        bind.execute(
+            sa.text("SELECT DISTINCT date_trunc('month', partition_date)::date FROM receipts")
+        ).scalars()
+    )
+    for month in sorted(months):
+        op.execute(
+            f"CREATE TABLE items_p{month:%Y%m} PARTITION OF items"
+            f" FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')"
+        )
+
+    op.execute(
+        f'INSERT INTO items ({ITEM_COLUMNS})'
+        ' SELECT i.id, r.partition_date, i.receipt_id, i.name, i.quantity, i.unit_price,'
+        ' i.total_price, i.category_id, i.suggested_category'
+        ' FROM items_unpartitioned i JOIN receipts r ON r.id = i.receipt_id'
+    )
+    op.drop_table('items_unpartitioned')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY items.id')
+    _create_indexes(trigram)
+    op.execute('ANALYZE items')
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    trigram = bind.scalar(sa.text("SELECT to_regclass('ix_items_name_trgm')")) is not None
+    op.rename_table('items', 'items_partitioned')
+    op.execute('ALTER TABLE items_partitioned RENAME CONSTRAINT items_pkey TO items_partitioned_pkey')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY NONE')
+    op.drop_index('ix_items_receipt_id', table_name='items_partitioned')
+    if trigram:
+        op.drop_index('ix_items_name_trgm', table_name='items_partitioned')
+
+    columns = [column for column in _item_columns() if getattr(column, 'name', None) != 'partition_date']
+    op.create_table('items', *columns, sa.PrimaryKeyConstraint('id'))
+    op.execute(
+        'INSERT INTO items (id, receipt_id, name, quantity, unit_price, total_price,'
+        ' category_id, suggested_category)'
+        ' SELECT id, receipt_id, name, quantity, unit_price, total_price,'
+        ' category_id, suggested_category FROM items_partitioned'
+    )
+    # drops the partitions with it
+    op.drop_table('items_partitioned')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY items.id')
+    _create_indexes(trigram)
+    op.drop_column('receipts', 'partition_date')
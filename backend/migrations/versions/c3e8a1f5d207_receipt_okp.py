@@ -0,0 +1,79 @@
+"""receipt okp for local QR code lookups
+
+Revision ID: c3e8a1f5d207
+Revises: a7d3f5b1c946
+Create Date: 2026-10-17 21:14:38.902157
+
+"""
+import json
+import re
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f5d207'
+down_revision: Union[str, None] = 'a7d3f5b1c946'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+OKP = re.compile(r'[0-9A-F]{8}(?:-?[0-9A-F]{8}){4}', re.IGNORECASE)
+
+
+def _okp(encoding: str, data: bytes):
+    # same as ekasa.payload_okp over payloads.decompress
+    if encoding == 'zstd':
+        import zstandard
+
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = zlib.decompress(data)
+    payload = json.loads(raw)
+    receipt = (payload.get('receipt') or payload) if isinstance(payload, dict) else None
+    value = receipt.get('okp') if isinstance(receipt, dict) else None
+    if not isinstance(value, str) or not OKP.fullmatch(value.strip()):
+        return None
+    digits = value.strip().replace('-', '').upper()
+    return '-'.join(digits[start:start + 8] for start in range(0, 40, 8))
+
+
+def upgrade() -> None:
+    op.add_column('receipts', sa.Column('okp', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    last_id = None
+    while True:
+        query = 'SELECT receipt_id, encoding, data FROM receipt_payloads'
+        if last_id is not None:
+            query += ' WHERE receipt_id > :last_id'
+        query += ' ORDER BY receipt_id LIMIT :limit'
+        rows = bind.execute(sa.text(query), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        updates = [
+            {'receipt_pk': receipt_pk, 'okp': okp}
+            for receipt_pk, encoding, data in rows
+            if (okp := _okp(encoding, data)) is not None
+        ]
+        if updates:
+            bind.execute(
+                sa.text('UPDATE receipts SET okp = :okp WHERE id = :receipt_pk'), updates
+            )
+        last_id = rows[-1][0]
+
+    op.create_index(
+        'ix_receipts_okp',
+        'receipts',
+        ['okp'],
+        unique=False,
+        postgresql_where=sa.text('okp IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_receipts_okp', table_name='receipts', postgresql_where=sa.text('okp IS NOT NULL'))
+    op.drop_column('receipts', 'okp')
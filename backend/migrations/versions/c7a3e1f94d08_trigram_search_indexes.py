@@ -0,0 +1,43 @@
+"""trigram search indexes
+
+Revision ID: c7a3e1f94d08
+Revises: 3b8f2d5e7a61
+Create Date: 2026-10-17 13:26:45.905512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a3e1f94d08'
+down_revision: Union[str, None] = '3b8f2d5e7a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # pg_trgm ships with the PostgreSQL contrib package (included in the postgres image)
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_items_name_trgm',
+        'items',
+        ['name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_receipts_merchant_name_trgm',
+        'receipts',
+        ['merchant_name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'merchant_name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_receipts_merchant_name_trgm', table_name='receipts')
+    op.drop_index('ix_items_name_trgm', table_name='items')
@@ -0,0 +1,95 @@
+"""move source_payload to compressed receipt_payloads
+
+Revision ID: e2f6b8c0a935
+Revises: c7a3e1f94d08
+Create Date: 2026-10-17 14:08:12.664021
+
+"""
+import json
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f6b8c0a935'
+down_revision: Union[str, None] = 'c7a3e1f94d08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.create_table('receipt_payloads',
+    sa.Column('receipt_id', sa.UUID(), nullable=False),
+    sa.Column('encoding', sa.String(length=16), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['receipt_id'], ['receipts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('receipt_id')
+    )
+    # the blobs are already compressed, keep them out of pglz
+    op.execute('ALTER TABLE receipt_payloads ALTER COLUMN data SET STORAGE EXTERNAL')
+
+    bind = op.get_bind()
+    payloads_table = sa.table(
+        'receipt_payloads',
+        sa.column('receipt_id', sa.UUID()),
+        sa.column('encoding', sa.String()),
+        sa.column('data', sa.LargeBinary()),
+    )
+    last_id = None
+    while True:
+        query = 'SELECT id, source_payload::text FROM receipts'
+        if last_id is not None:
+            query += ' WHERE id > :last_id'
+        query += ' ORDER BY id LIMIT :limit'
+        rows = bind.execute(
+            sa.text(query), {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            sa.insert(payloads_table),
+            [
+                {
+                    'receipt_id': receipt_pk,
+                    'encoding': 'zlib',
+                    'data': zlib.compress(
+                        json.dumps(
+                            json.loads(raw), ensure_ascii=False, separators=(',', ':')
+                        ).encode(),
+                        6,
+                    ),
+                }
+                for receipt_pk, raw in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
+    op.drop_column('receipts', 'source_payload')
+
+
+def downgrade() -> None:
+    op.add_column('receipts', sa.Column('source_payload', sa.JSON(), nullable=True))
+    bind = op.get_bind()
+    rows = bind.execute(sa.text('SELECT receipt_id, encoding, data FROM receipt_payloads'))
+    updates = []
+    for receipt_pk, encoding, data in rows:
+        if encoding == 'zstd':
+            import zstandard
+
+            raw = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            raw = zlib.decompress(data)
+        updates.append({'receipt_pk': receipt_pk, 'payload': raw.decode()})
+    if updates:
+        bind.execute(
+            sa.text('UPDATE receipts SET source_payload = CAST(:payload AS json) WHERE id = :receipt_pk'),
+            updates,
+        )
+    op.execute("UPDATE receipts SET source_payload = '{}' WHERE source_payload IS NULL")
+    op.alter_column('receipts', 'source_payload', nullable=False)
+    op.drop_table('receipt_payloads')
@@ -1,16 +1,23 @@
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 from sqlalchemy import (
+    DDL,
     JSON,
-    Column,
+    Date,
     DateTime,
     Float,
     ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
     String,
     Text,
     UniqueConstraint,
+    event,
+    func,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -25,20 +32,58 @@ class Receipt(Base):
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
     receipt_id: Mapped[str] = mapped_column(String(128), unique=True, nullable=False)
+    # OKP code from the FS payload, what QR codes of offline receipts carry (ekasa.py)
+    okp: Mapped[Optional[str]] = mapped_column(String(64))
     issue_date: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     merchant_name: Mapped[Optional[str]] = mapped_column(String(255))
-    merchant_address = Column(JSON, nullable=True)
+    # not returned by any endpoint, so loaded only on access
+    merchant_address: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True, deferred=True)
     total_amount: Mapped[Optional[float]] = mapped_column(Float)
-    source_payload = Column(JSON, nullable=False)
     source: Mapped[str] = mapped_column(String(32), default="fs")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.utcnow
     )
+    # set when stored items change after ingestion (re-categorization)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # month partition of the items (partitioning.partition_date)
+    partition_date: Mapped[date] = mapped_column(Date, nullable=False)
 
     items: Mapped[list["Item"]] = relationship(
         "Item", back_populates="receipt", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        Index("ix_receipts_issue_date_id", "issue_date", "id"),
+        Index("ix_receipts_okp", "okp", postgresql_where=text("okp IS NOT NULL")),
+    )
+
+
+class ReceiptPayload(Base):
+    """Raw FS response of a receipt, compressed (see payloads.py)."""
+
+    __tablename__ = "receipt_payloads"
+
+    receipt_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("receipts.id", ondelete="CASCADE"), primary_key=True
+    )
+    encoding: Mapped[str] = mapped_column(String(16), nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+# prefix search on merchant names for the receipt listing filter
+Index(
+    "ix_receipts_merchant_name_lower",
+    func.lower(Receipt.merchant_name).label("merchant_lower"),
+    postgresql_ops={"merchant_lower": "text_pattern_ops"},
+)
+# trigram indexes behind /search (ILIKE and word similarity), need pg_trgm
+Index(
+    "ix_receipts_merchant_name_trgm",
+    Receipt.merchant_name,
+    postgresql_using="gin",
+    postgresql_ops={"merchant_name": "gin_trgm_ops"},
+)
+
 
 class Category(Base):
     __tablename__ = "categories"
@@ -66,11 +111,16 @@ class CategoryRule(Base):
 
 
 class Item(Base):
+    """Range-partitioned by month of partition_date (see partitioning.py)."""
+
     __tablename__ = "items"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # the receipt's partition_date; part of the key because Postgres requires
+    # the partition column in every unique index of a partitioned table
+    partition_date: Mapped[date] = mapped_column(Date, primary_key=True)
     receipt_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("receipts.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("receipts.id"), nullable=False, index=True
     )
     name: Mapped[str] = mapped_column(String(255))
     quantity: Mapped[float] = mapped_column(Float, default=1)
@@ -81,3 +131,68 @@ class Item(Base):
 
     receipt: Mapped[Receipt] = relationship("Receipt", back_populates="items")
     category: Mapped[Optional[Category]] = relationship("Category", back_populates="items")
+
+    __table_args__ = (
+        Index(
+            "ix_items_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (partition_date)"},
+    )
+
+
+class MonthlyCategoryTotal(Base):
+    """Pre-aggregated /stats rollup, kept in step by services.insert_prepared."""
+
+    __tablename__ = "monthly_category_totals"
+
+    year: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    month: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    category: Mapped[str] = mapped_column(String(100), primary_key=True)
+    total: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    item_count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class IngestJob(Base):
+    """Queued POST /receipts/fetch?mode=async request, worked off by jobs.py."""
+
+    __tablename__ = "ingest_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    # queued -> running -> done | failed (a failed attempt goes back to queued)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")
+    request: Mapped[dict] = mapped_column(JSON, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    run_after: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    locked_by: Mapped[Optional[str]] = mapped_column(String(64))
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    receipt_id: Mapped[Optional[str]] = mapped_column(String(128))
+    status_code: Mapped[Optional[int]] = mapped_column(Integer)
+    detail: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # only unfinished jobs are ever scanned by workers
+        Index(
+            "ix_ingest_jobs_pending",
+            "run_after",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
+# create_all on a fresh database needs the extension before the trigram indexes
+for _table in (Receipt.__table__, Item.__table__):
+    event.listen(_table, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
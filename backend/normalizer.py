@@ -0,0 +1,48 @@
+import re
+from datetime import datetime, tzinfo
+from typing import Any, Optional
+
+from dateutil import parser, tz
+
+# the layout FS uses; anything else (offsets out of range too) goes through dateutil
+_ISO_TIMESTAMP = re.compile(
+    r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?)(Z|[+-](?:[01]\d|2[0-3]):[0-5]\d)?"
+)
+_timezones: dict[str, tzinfo] = {}
+
+
+def _timezone(designator: str) -> tzinfo:
+    # the tzinfo objects isoparse would attach: tzutc for zero, tzoffset otherwise
+    found = _timezones.get(designator)
+    if found is None:
+        if designator == "Z":
+            found = tz.UTC
+        else:
+            sign = -1 if designator[0] == "-" else 1
+            seconds = sign * (int(designator[1:3]) * 3600 + int(designator[4:6]) * 60)
+            found = tz.UTC if seconds == 0 else tz.tzoffset(None, seconds)
+        _timezones[designator] = found
+    return found
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """`dateutil.parser.isoparse`, None for unparsable values.
+
+    Plain `YYYY-MM-DDTHH:MM:SS[.ffffff][Z|±HH:MM]` strings skip dateutil and
+    go through `datetime.fromisoformat`, with the same tzinfo attached.
+    """
+    if type(value) is str:
+        match = _ISO_TIMESTAMP.fullmatch(value)
+        if match is not None:
+            try:
+                parsed = datetime.fromisoformat(match.group(1))
+            except ValueError:
+                pass
+            else:
+                designator = match.group(2)
+                return parsed.replace(tzinfo=_timezone(designator)) if designator else parsed
+    try:
+        return parser.isoparse(value)
+    except (ValueError, TypeError):
+        return None
+
@@ -0,0 +1,171 @@
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+PARENT = "items"
+DEFAULT_PARTITION = "items_default"
+_MONTHLY = re.compile(r"items_p(\d{4})(\d{2})")
+
+
+def partition_date(issue_date: Optional[datetime], created_at: datetime) -> date:
+    """Partition key of a receipt and its items.
+
+    The UTC date of issue_date, or of created_at for receipts without one.
+    Naive values are taken as UTC; services.prepare_receipt passes aware ones,
+    so the key matches the stored timestamptz whatever the session time zone.
+    """
+    moment = issue_date or created_at
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"items_p{month:%Y%m}"
+
+
+def date_bounds(
+    start: Optional[datetime], end: Optional[datetime]
+) -> tuple[Optional[date], Optional[date]]:
+    """Inclusive partition_date bounds of the rows with issue_date in [start, end).
+
+    Aware datetimes map exactly through UTC (`end` itself is excluded). Naive
+    ones are read by Postgres in the session time zone, so they get a day of
+    margin on each side.
+    """
+    def bound(value: Optional[datetime], shift: timedelta, margin: int) -> Optional[date]:
+        if value is None:
+            return None
+        if value.tzinfo is not None:
+            return (value.astimezone(timezone.utc) + shift).date()
+        return value.date() + timedelta(days=margin)
+
+    return bound(start, timedelta(0), -1), bound(end, -timedelta(microseconds=1), 1)
+
+
+def prune(column: Any, start: Optional[datetime], end: Optional[datetime]) -> list:
+    """Redundant partition_date criteria for an issue_date range, so the
+    planner skips partitions the range cannot touch."""
+    low, high = date_bounds(start, end)
+    criteria = []
+    if low is not None:
+        criteria.append(column >= low)
+    if high is not None:
+        criteria.append(column <= high)
+    return criteria
+
+
+def partitions(connection: Connection) -> list[str]:
+    """Names of the current partitions of `items`, oldest month first, default last."""
+    names = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+            " WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": PARENT},
+    ).scalars().all()
+    return sorted(names, key=lambda name: (name == DEFAULT_PARTITION, name))
+
+
+def _month_of(name: str) -> Optional[date]:
+    match = _MONTHLY.fullmatch(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def create_month(connection: Connection, month: date) -> bool:
+    """Create and attach the partition of `month`; False if it already exists.
+
+    Rows of that month already sitting in the default partition are moved
+    into it first, otherwise attaching would fail.
+    """
+    month = month_start(month)
+    name = partition_name(month)
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+    bounds = {"low": month, "high": add_months(month, 1)}
+    connection.execute(
+        text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    )
+    # keep inserts out of the default partition until the new one is attached
+    connection.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE"))
+    connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION}"
+            " WHERE partition_date >= :low AND partition_date < :high RETURNING *)"
+            f" INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE {PARENT} ATTACH PARTITION {name}"
+            f" FOR VALUES FROM ('{bounds['low']}') TO ('{bounds['high']}')"
+        )
+    )
+    return True
+
+
+def ensure(
+    connection: Connection,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    today: Optional[date] = None,
+) -> list[str]:
+    """Create the default partition, the partitions from this month to
+    `months_ahead` months ahead, and one for every month that has rows in
+    the default partition. Returns the names of the created partitions."""
+    connection.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT")
+    )
+    current = month_start(today or datetime.now(timezone.utc).date())
+    months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+    months.update(
+        month_start(value)
+        for value in connection.execute(
+            text(f"SELECT DISTINCT date_trunc('month', partition_date)::date FROM {DEFAULT_PARTITION}")
+        ).scalars()
+    )
+    return [partition_name(month) for month in sorted(months) if create_month(connection, month)]
+
+
+def drop_before(connection: Connection, month: date) -> dict[str, Any]:
+    """Drop items, receipts and rollup rows older than `month`.
+
+    Whole partitions are detached and dropped instead of deleted row by row;
+    only the default partition and the (unpartitioned) receipts need a
+    DELETE. The rollup loses the months before `month` as well.
+    """
+    month = month_start(month)
+    dropped = []
+    for name in partitions(connection):
+        partition_month = _month_of(name)
+        if partition_month is not None and add_months(partition_month, 1) <= month:
+            connection.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    bound = {"month": month}
+    connection.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE partition_date < :month"), bound
+    )
+    receipts = connection.execute(
+        text("DELETE FROM receipts WHERE partition_date < :month"), bound
+    ).rowcount
+    connection.execute(
+        text("DELETE FROM monthly_category_totals WHERE (year, month) < (:year, :month_number)"),
+        {"year": month.year, "month_number": month.month},
+    )
+    return {"partitions": dropped, "receipts": receipts}
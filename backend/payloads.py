@@ -0,0 +1,28 @@
+import json
+import zlib
+from typing import Any
+
+try:  # optional, faster and smaller than zlib
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+
+def compress(payload: dict[str, Any]) -> tuple[str, bytes]:
+    """Serialize a raw FS payload; returns (encoding, data) for receipt_payloads."""
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=6).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+
+def decompress(encoding: str, data: bytes) -> dict[str, Any]:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Payload je komprimovaný zstd, nainštaluj balík zstandard")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Neznáme kódovanie payloadu: {encoding}")
+    return json.loads(raw)
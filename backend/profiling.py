@@ -0,0 +1,234 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+
+# off: disabled; header: only requests sent with `X-Profile: 1`; all: every request
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").lower()
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_N1_THRESHOLD = int(os.getenv("PROFILE_N1_THRESHOLD", "5"))
+
+logger = logging.getLogger(__name__)
+
+_PARAM = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?")
+_PARAM_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACE = re.compile(r"\s+")
+# innermost frames of threads that are parked, not working
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL text with parameters and IN-list lengths erased, for grouping repeats."""
+    shape = _PARAM.sub("?", statement)
+    shape = _PARAM_LIST.sub("?, ...", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class RequestProfile:
+    def __init__(self, n1_threshold: int = PROFILE_N1_THRESHOLD):
+        self.n1_threshold = n1_threshold
+        self.statements: list[tuple[str, float, bool]] = []
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float, executemany: bool) -> None:
+        with self._lock:
+            self.statements.append((statement, duration, executemany))
+
+    @property
+    def query_count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def db_time(self) -> float:
+        return sum(duration for _, duration, _ in self.statements)
+
+    def repeated(self) -> list[tuple[str, int, float]]:
+        """Statement shapes run more than `n1_threshold` times: (shape, count, total seconds)."""
+        counts: Counter = Counter()
+        times: dict[str, float] = {}
+        for statement, duration, _ in self.statements:
+            shape = statement_shape(statement)
+            counts[shape] += 1
+            times[shape] = times.get(shape, 0.0) + duration
+        return [
+            (shape, count, times[shape])
+            for shape, count in counts.most_common()
+            if count > self.n1_threshold
+        ]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "queries": self.query_count,
+            "db_time_ms": round(self.db_time * 1000, 3),
+            "repeated": [
+                {"statement": shape, "count": count, "time_ms": round(seconds * 1000, 3)}
+                for shape, count, seconds in self.repeated()
+            ],
+            "statements": [
+                {"statement": statement, "time_ms": round(duration * 1000, 3), "executemany": many}
+                for statement, duration, many in self.statements
+            ],
+            "samples": self.samples,
+        }
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+def instrument_engine(engine: Any) -> None:
+    """Record every statement of a (sync) engine into the active RequestProfile."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is not None and conn.info.get("profile_started"):
+            profile.record(statement, time.perf_counter() - conn.info["profile_started"].pop(), executemany)
+
+
+@contextmanager
+def capture(n1_threshold: int = PROFILE_N1_THRESHOLD) -> Iterator[RequestProfile]:
+    """Record the SQL issued inside the block, e.g. in a script or a test:
+
+        with profiling.capture() as profile:
+            services.get_receipt(session, receipt_id)
+        assert not profile.repeated()
+    """
+    profile = RequestProfile(n1_threshold)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of all busy threads into collapsed-stack counts.
+
+    Sync endpoints run in the threadpool, so a per-thread cProfile would miss
+    them; sampling every thread covers both the event loop and the pool.
+    """
+
+    def __init__(self, profile: RequestProfile, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.profile.stacks[";".join(reversed(stack))] += 1
+                self.profile.samples += 1
+
+
+# one sampled request at a time; concurrent ones only get the SQL summary
+_sampler_lock = threading.Lock()
+
+
+def _wants_profile(scope) -> bool:
+    if PROFILE_MODE == "all":
+        return True
+    if PROFILE_MODE == "header":
+        return (b"x-profile", b"1") in scope.get("headers", ())
+    return False
+
+
+def _save(profile: RequestProfile, scope, status: int, elapsed: float, profile_id: str) -> None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    route = getattr(scope.get("route"), "path", None) or scope["path"]
+    report = {
+        "id": profile_id,
+        "method": scope["method"],
+        "path": scope["path"],
+        "route": route,
+        "status": status,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        **profile.summary(),
+    }
+    (PROFILE_DIR / f"{profile_id}.json").write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    if profile.stacks:
+        # collapsed stacks, readable by flamegraph.pl / speedscope
+        (PROFILE_DIR / f"{profile_id}.folded").write_text(
+            "".join(f"{stack} {count}\n" for stack, count in profile.stacks.most_common())
+        )
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling opted-in requests (see PROFILE_MODE).
+
+    Adds X-DB-Query-Count, X-DB-Time-Ms and X-Profile-Id to the response and
+    writes `<id>.json` (SQL log, repeats) and `<id>.folded` to PROFILE_DIR.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-db-query-count", str(profile.query_count).encode()),
+                    (b"x-db-time-ms", f"{profile.db_time * 1000:.2f}".encode()),
+                    (b"x-profile-id", profile_id.encode()),
+                ]
+            await send(message)
+
+        sampler = None
+        if _sampler_lock.acquire(blocking=False):
+            sampler = _Sampler(profile, PROFILE_INTERVAL)
+            sampler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            if sampler is not None:
+                sampler.stopped.set()
+                sampler.join()
+                _sampler_lock.release()
+            for shape, count, seconds in profile.repeated():
+                logger.warning(
+                    "possible N+1 in %s %s: %d x %s (%.1f ms)",
+                    scope["method"], scope["path"], count, shape, seconds * 1000,
+                )
+            _save(profile, scope, status[0], elapsed, profile_id)
@@ -0,0 +1,156 @@
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, TextIO
+
+from sqlalchemy import Integer, bindparam, cast, extract, func, select, update
+
+import categorizer
+import models
+import partitioning
+import rollup
+import services
+from database import SessionLocal
+
+RECATEGORIZE_BATCH_SIZE = 5000
+
+
+def _load_checkpoint(path: Path, date_from, date_to) -> dict:
+    state = json.loads(path.read_text())
+    expected = [str(date_from) if date_from else None, str(date_to) if date_to else None]
+    if state.get("range") != expected:
+        raise ValueError(
+            f"Checkpoint {path} was written for range {state.get('range')}, not {expected}"
+        )
+    return state
+
+
+def _save_checkpoint(path: Path, state: dict) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state))
+    tmp.replace(path)
+
+
+def run(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    batch_size: int = RECATEGORIZE_BATCH_SIZE,
+    checkpoint: Path = Path("recategorize.checkpoint.json"),
+    resume: bool = False,
+    out: TextIO = sys.stderr,
+) -> dict:
+    """Re-apply the current category rules to stored items.
+
+    Walks items in id order, one short transaction per batch, and writes only
+    rows whose category changed. Progress (last item id, touched months) is
+    saved to `checkpoint` after every batch so an interrupted run can resume.
+    """
+    if resume and checkpoint.exists():
+        state = _load_checkpoint(checkpoint, date_from, date_to)
+    else:
+        state = {
+            "range": [str(date_from) if date_from else None, str(date_to) if date_to else None],
+            "last_id": 0,
+            "scanned": 0,
+            "changed": 0,
+            "months": [],
+        }
+    months = {tuple(month) for month in state["months"]}
+
+    categorizer.invalidate()
+    items_table = models.Item.__table__
+    update_item = (
+        update(items_table)
+        .where(
+            items_table.c.id == bindparam("item_id"),
+            items_table.c.partition_date == bindparam("item_partition_date"),
+        )
+        .values(
+            category_id=bindparam("new_category_id"),
+            suggested_category=bindparam("new_suggested"),
+        )
+    )
+    started = time.perf_counter()
+    scanned_at_start = state["scanned"]
+
+    with SessionLocal() as session:
+        matcher = categorizer.get_matcher(session)
+        while True:
+            stmt = (
+                select(
+                    models.Item.id,
+                    models.Item.partition_date,
+                    models.Item.receipt_id,
+                    models.Item.name,
+                    models.Item.category_id,
+                    models.Item.suggested_category,
+                    models.Receipt.merchant_name,
+                    cast(extract("year", models.Receipt.issue_date), Integer),
+                    cast(extract("month", models.Receipt.issue_date), Integer),
+                )
+                .join(models.Receipt, models.Item.receipt_id == models.Receipt.id)
+                .where(
+                    models.Item.id > state["last_id"],
+                    *partitioning.prune(models.Item.partition_date, date_from, date_to),
+                )
+                .order_by(models.Item.id)
+                .limit(batch_size)
+            )
+            if date_from is not None:
+                stmt = stmt.where(models.Receipt.issue_date >= date_from)
+            if date_to is not None:
+                stmt = stmt.where(models.Receipt.issue_date < date_to)
+            rows = session.execute(stmt).all()
+            if not rows:
+                break
+
+            changes = []
+            receipts = set()
+            for row in rows:
+                item_id, partition_date, receipt_pk, name, category_id, suggested, merchant, year, month = row
+                match = matcher.categorize(name or "", merchant)
+                new_category_id = match.category_id if match else None
+                new_suggested = match.category_name if match else None
+                if (new_category_id, new_suggested) != (category_id, suggested):
+                    changes.append(
+                        {
+                            "item_id": item_id,
+                            "item_partition_date": partition_date,
+                            "new_category_id": new_category_id,
+                            "new_suggested": new_suggested,
+                        }
+                    )
+                    receipts.add(receipt_pk)
+                    if year is not None:
+                        months.add((year, month))
+            if changes:
+                session.execute(update_item, changes)
+                session.execute(
+                    update(models.Receipt)
+                    .where(models.Receipt.id.in_(receipts))
+                    .values(updated_at=func.now())
+                )
+            session.commit()
+
+            state["last_id"] = rows[-1][0]
+            state["scanned"] += len(rows)
+            state["changed"] += len(changes)
+            state["months"] = sorted(months)
+            _save_checkpoint(checkpoint, state)
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(
+                f"item id <= {state['last_id']}: {state['scanned']} scanned,"
+                f" {state['changed']} changed,"
+                f" {(state['scanned'] - scanned_at_start) / elapsed:.0f} items/s",
+                file=out,
+                flush=True,
+            )
+
+        if months:
+            rollup.rebuild(session, months)
+            session.commit()
+    services.categories_changed(months)
+    checkpoint.unlink(missing_ok=True)
+    return state
@@ -0,0 +1,143 @@
+from datetime import date, datetime, time
+from typing import Iterable, Optional
+
+from sqlalchemy import Integer, cast, delete, extract, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import models
+import partitioning
+
+UNCATEGORIZED = "Nezaradené"
+
+_COLUMNS = ["year", "month", "category", "total", "item_count"]
+# first key of the per-month advisory locks (second key is year * 100 + month)
+_LOCK_NAMESPACE = 7212
+
+
+def category_label():
+    return func.coalesce(
+        models.Category.name,
+        func.coalesce(models.Item.suggested_category, UNCATEGORIZED),
+    )
+
+
+def _year():
+    return cast(extract("year", models.Receipt.issue_date), Integer)
+
+
+def _month():
+    return cast(extract("month", models.Receipt.issue_date), Integer)
+
+
+def _aggregate(*criteria):
+    # the same grouping the old per-request /stats query did; extract() runs in
+    # the database so month boundaries follow the session time zone as before
+    label = category_label()
+    return (
+        select(
+            _year(),
+            _month(),
+            label,
+            func.coalesce(func.sum(models.Item.total_price), 0.0),
+            func.count(models.Item.id),
+        )
+        .select_from(models.Item)
+        .join(models.Receipt, models.Item.receipt_id == models.Receipt.id)
+        .outerjoin(models.Category, models.Item.category_id == models.Category.id)
+        .where(models.Receipt.issue_date.is_not(None), *criteria)
+        .group_by(_year(), _month(), label)
+    )
+
+
+def _lock_months(session: Session, months: Iterable[tuple[int, int]]) -> None:
+    # always in (year, month) order, so two writers cannot wait on each other
+    for year, month in sorted(set(months)):
+        session.execute(
+            select(func.pg_advisory_xact_lock(_LOCK_NAMESPACE, year * 100 + month))
+        )
+
+
+def _lock_receipt_months(session: Session, pks: list) -> None:
+    # the months of the receipts, locked in one round trip in (year, month) order
+    months = (
+        select(_year().label("year"), _month().label("month"))
+        .where(models.Receipt.id.in_(pks), models.Receipt.issue_date.is_not(None))
+        .distinct()
+        .order_by("year", "month")
+        .subquery()
+    )
+    session.execute(
+        select(func.pg_advisory_xact_lock(_LOCK_NAMESPACE, months.c.year * 100 + months.c.month))
+    ).all()
+
+
+def apply_receipts(
+    session: Session, receipt_pks: Iterable, partition_dates: Optional[Iterable[date]] = None
+) -> set[tuple[int, int]]:
+    """Add the items of freshly inserted receipts to the rollup.
+
+    `partition_dates` of those receipts, when known, limit the item scan to
+    their partitions. Returns the (year, month) pairs that changed.
+
+    Takes the advisory locks of the affected months until the end of the
+    transaction, so it waits for a concurrent rebuild() of those months.
+    """
+    pks = list(receipt_pks)
+    if not pks:
+        return set()
+    _lock_receipt_months(session, pks)
+    criteria = [models.Receipt.id.in_(pks)]
+    if partition_dates is not None:
+        criteria.append(models.Item.partition_date.in_(list(partition_dates)))
+    table = models.MonthlyCategoryTotal.__table__
+    # rows are upserted in key order, so concurrent ingests lock them in the same order
+    source = _aggregate(*criteria)
+    source = source.order_by(*list(source.selected_columns)[:3])
+    stmt = pg_insert(table).from_select(_COLUMNS, source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.year, table.c.month, table.c.category],
+        set_={
+            "total": table.c.total + stmt.excluded.total,
+            "item_count": table.c.item_count + stmt.excluded.item_count,
+        },
+    ).returning(table.c.year, table.c.month)
+    return {(year, month) for year, month in session.execute(stmt).all()}
+
+
+def rebuild(session: Session, months: Optional[Iterable[tuple[int, int]]] = None) -> int:
+    """Recompute the rollup from items, for all months or only the given ones.
+
+    Does not commit. Returns the number of rollup rows written. Concurrent
+    apply_receipts() calls for the rebuilt months wait until the transaction
+    ends (table lock for a full rebuild, advisory month locks otherwise).
+    """
+    table = models.MonthlyCategoryTotal.__table__
+    if months is None:
+        session.execute(text(f"LOCK TABLE {table.name} IN EXCLUSIVE MODE"))
+        session.execute(delete(table))
+        source = _aggregate()
+    else:
+        months = list(months)
+        if not months:
+            return 0
+        _lock_months(session, months)
+        session.execute(delete(table).where(tuple_(table.c.year, table.c.month).in_(months)))
+        start = datetime(*min(months), 1)
+        end = datetime.combine(partitioning.add_months(date(*max(months), 1), 1), time())
+        source = _aggregate(
+            tuple_(_year(), _month()).in_(months),
+            *partitioning.prune(models.Item.partition_date, start, end),
+        )
+    result = session.execute(pg_insert(table).from_select(_COLUMNS, source))
+    return result.rowcount
+
+
+def monthly_totals(session: Session, year: int, month: int) -> list[tuple[str, float]]:
+    table = models.MonthlyCategoryTotal
+    rows = session.execute(
+        select(table.category, table.total)
+        .where(table.year == year, table.month == month)
+        .order_by(table.category)
+    ).all()
+    return [(category, float(total)) for category, total in rows]
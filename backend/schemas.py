@@ -1,8 +1,8 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 class ReceiptFetchRequest(BaseModel):
@@ -19,6 +19,28 @@ class ReceiptFetchRequest(BaseModel):
         return self
 
 
+class ReceiptBatchFetchRequest(BaseModel):
+    entries: list[ReceiptFetchRequest] = Field(min_length=1, max_length=1000)
+    concurrency: Optional[int] = Field(
+        default=None, ge=1, description="Max. počet súčasných volaní FS API"
+    )
+
+
+class ReceiptBatchEntryResult(BaseModel):
+    index: int
+    status: Literal["created", "exists", "failed"]
+    status_code: int
+    receipt_id: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class ReceiptBatchFetchResponse(BaseModel):
+    created: int
+    existing: int
+    failed: int
+    results: list[ReceiptBatchEntryResult]
+
+
 class ItemOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -30,6 +52,12 @@ class ItemOut(BaseModel):
     category: Optional[str]
     suggested_category: Optional[str]
 
+    @field_validator("category", mode="before")
+    @classmethod
+    def category_name(cls, value):
+        # ORM items carry the Category object, the API exposes its name
+        return getattr(value, "name", value)
+
 
 class ReceiptOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -54,3 +82,58 @@ class StatsResponse(BaseModel):
     month: int
     year: int
     totals: list[StatsRow]
+
+
+class SeriesPoint(BaseModel):
+    period: datetime
+    group: str
+    total: float
+    item_count: int
+
+
+class SeriesResponse(BaseModel):
+    start: datetime
+    end: datetime
+    granularity: Literal["day", "week", "month", "year"]
+    group_by: Literal["category", "merchant", "source"]
+    total: float
+    item_count: int
+    points: list[SeriesPoint]
+
+
+class SearchHit(BaseModel):
+    item_id: int
+    receipt_id: str
+    issue_date: Optional[datetime]
+    merchant_name: Optional[str]
+    name: str
+    quantity: float
+    total_price: Optional[float]
+    category: str
+
+
+class SearchResponse(BaseModel):
+    query: str
+    target: Literal["item", "merchant"]
+    mode: Literal["contains", "prefix", "fuzzy"]
+    item_count: int
+    receipt_count: int
+    total: float
+    items: list[SearchHit]
+
+
+class JobOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    status: Literal["queued", "running", "done", "failed"]
+    attempts: int
+    run_after: datetime
+    receipt_id: Optional[str] = Field(default=None, description="Uložený bloček (stav done)")
+    status_code: Optional[int] = Field(
+        default=None, description="201 nový bloček, 200 už existoval, inak kód chyby"
+    )
+    detail: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,60 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi import Response
+
+try:  # optional, faster encoder (pip install orjson)
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _isoformat(value: date, utc_z: bool) -> str:
+    text = value.isoformat()
+    if utc_z and text.endswith("+00:00"):
+        return text[:-6] + "Z"
+    return text
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return _isoformat(value, utc_z=True)
+    return str(value)
+
+
+def _default_plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return _isoformat(value, utc_z=False)
+    return str(value)
+
+
+def dumps(value: Any, utc_z: bool = True) -> bytes:
+    """Compact UTF-8 JSON.
+
+    With `utc_z` UTC datetimes end in "Z", the way pydantic writes them in
+    response models; otherwise they keep the `+00:00` of `isoformat()`.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            value,
+            default=str,
+            option=orjson.OPT_UTC_Z if utc_z else 0,
+        )
+    return json.dumps(
+        value,
+        default=_default if utc_z else _default_plain,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+class RawJSONResponse(Response):
+    """Response for content already encoded by `dumps`.
+
+    Returning it from an endpoint skips FastAPI's response_model validation
+    and serialization, while the declared response_model still documents
+    the endpoint in the OpenAPI schema.
+    """
+
+    media_type = "application/json"
@@ -1,16 +1,96 @@
+import asyncio
+import base64
+import hashlib
 import json
-from datetime import datetime
-from typing import Any, Optional
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone, tzinfo
+from typing import Any, Iterable, Optional
 
 import httpx
-from dateutil import parser
-from sqlalchemy import extract, func, select
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import ARRAY, Text, and_, bindparam, func, insert, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError, DataError, IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, selectinload
 
+import cache
+import categorizer
+import ekasa
+import fs_client
+import metrics
 import models
+import normalizer
+import partitioning
+import payloads
+import rollup
+from database import engine, session_time_zone
 
-FS_API_URL = "https://ekasa.financnasprava.sk/mdu/api/v1/opd/receipt/find"
+FS_FETCH_CONCURRENCY = int(os.getenv("FS_FETCH_CONCURRENCY", "8"))
+BATCH_PERSIST_GROUP_SIZE = int(os.getenv("BATCH_PERSIST_GROUP_SIZE", "50"))
+BULK_INSERT_CHUNK = 1000
+FS_CACHE_SIZE = int(os.getenv("FS_CACHE_SIZE", "1024"))
+FS_CACHE_TTL = float(os.getenv("FS_CACHE_TTL", "600"))
+FS_NEGATIVE_CACHE_TTL = float(os.getenv("FS_NEGATIVE_CACHE_TTL", "30"))
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "256"))
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "300"))
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "2048"))
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "60"))
+# redis://host:6379/0 shares read caches and their invalidation between processes
+READ_CACHE_URL = os.getenv("READ_CACHE_URL") or None
+KNOWN_RECEIPTS_CAPACITY = int(os.getenv("KNOWN_RECEIPTS_CAPACITY", "1000000"))
+KNOWN_RECEIPTS_LOAD_CHUNK = 10_000
+# Postgres NOTIFY channels: invalidations of in-process read caches, and
+# receipt_ids/OKPs inserted by any process for the known receipts filters
+INVALIDATION_CHANNEL = "read_cache_invalidation"
+KNOWN_RECEIPTS_CHANNEL = "known_receipts"
+# NOTIFY payloads must stay under 8000 bytes; longer tag lists clear everything
+_MAX_NOTIFY_PAYLOAD = 7900
+
+logger = logging.getLogger(__name__)
+
+_fs_payloads = cache.TTLCache("fs_payloads", FS_CACHE_SIZE, FS_CACHE_TTL)
+_fs_not_found = cache.TTLCache("fs_not_found", FS_CACHE_SIZE, FS_NEGATIVE_CACHE_TTL)
+_fs_lookups = cache.SingleFlight("fs_lookups")
+_series_cache = cache.tagged_cache("stats_series", STATS_CACHE_SIZE, STATS_CACHE_TTL, READ_CACHE_URL)
+# encoded /receipts, /receipts/{id} and /stats responses, see the *_tags helpers
+read_cache = cache.tagged_cache("read_responses", READ_CACHE_SIZE, READ_CACHE_TTL, READ_CACHE_URL)
+
+# list pages without a cursor / without a next page, receipt details
+LIST_HEAD_TAG = "receipts:head"
+LIST_TAIL_TAG = "receipts:tail"
+DETAILS_TAG = "receipts:details"
+UNDATED_TAG = "month:none"
+# ranges spanning more months share one tag instead of one per month
+MAX_RANGE_TAGS = 120
+WIDE_RANGE_TAG = "months:wide"
+# tells this process's own notifications apart from other processes'
+_process_token = uuid.uuid4().hex
+
+# receipt_ids and OKPs of stored receipts, see find_known_receipt; loaded by the
+# API once it listens on KNOWN_RECEIPTS_CHANNEL, which brings the inserts of
+# every process (API workers, cli worker, import)
+_known_receipts = cache.BloomFilter("known_receipts", KNOWN_RECEIPTS_CAPACITY)
+_known_lookups = {
+    outcome: metrics.KNOWN_RECEIPT_LOOKUPS.labels(outcome) for outcome in ("hit", "filtered", "miss")
+}
+
+for _cache in (_series_cache, read_cache):
+    metrics.CACHE_HIT_RATIO.set_function(lambda c=_cache: c.stats()["hit_ratio"] or 0.0, _cache.name)
+    metrics.CACHE_BYTES.set_function(_cache.memory, _cache.name)
+
+PERSIST_STAGES = ("fs_fetch", "normalize", "categorize", "compress", "insert", "rollup", "commit", "load")
+_stage = {name: metrics.PERSIST_STAGE_DURATION.labels(name) for name in PERSIST_STAGES}
+
+SERIES_GROUPS = {
+    "category": rollup.category_label,
+    "merchant": lambda: func.coalesce(models.Receipt.merchant_name, "Neznámy obchodník"),
+    "source": lambda: models.Receipt.source,
+}
 
 
 class ReceiptAlreadyExists(Exception):
@@ -19,6 +99,10 @@ class ReceiptAlreadyExists(Exception):
         self.receipt = receipt
 
 
+class InvalidCursor(ValueError):
+    pass
+
+
 class ReceiptFetchError(Exception):
     def __init__(self, status_code: int, detail: str):
         super().__init__(detail)
@@ -26,21 +110,67 @@ class ReceiptFetchError(Exception):
         self.detail = detail
 
 
-async def fetch_receipt_from_fs(
-    receipt_id: Optional[str] = None, qr_code: Optional[str] = None
-) -> dict[str, Any]:
-    if not receipt_id and not qr_code:
-        raise ValueError("receipt_id alebo qr_code je povinné")
+@dataclass
+class PreparedReceipt:
+    receipt: dict[str, Any]
+    items: list[dict[str, Any]]
+    payload_encoding: str
+    payload_data: bytes
+
+
+@dataclass
+class BulkPersistResult:
+    created: dict[str, uuid.UUID] = field(default_factory=dict)
+    duplicates: list[str] = field(default_factory=list)
+    months: set[tuple[int, int]] = field(default_factory=set)
+    # UTC (year, month) of the issue_date of created receipts, None for undated
+    issue_months: set[Optional[tuple[int, int]]] = field(default_factory=set)
+
+
+@dataclass
+class BatchEntryOutcome:
+    status: str  # created | exists | failed
+    status_code: int
+    receipt_id: Optional[str] = None
+    detail: Optional[str] = None
+
+
+def rejected_status(exc: DBAPIError) -> Optional[int]:
+    """HTTP status for an error the same statement would hit again, else None.
+
+    asyncpg errors reach us as plain DBAPIError, so the SQLSTATE class decides:
+    22 (a value the columns reject) is 422, 23 (a constraint violation) is 409.
+    """
+    code = getattr(exc.orig, "sqlstate", None) or getattr(exc.orig, "pgcode", None) or ""
+    if isinstance(exc, DataError) or code.startswith("22"):
+        return 422
+    if isinstance(exc, IntegrityError) or code.startswith("23"):
+        return 409
+    return None
+
 
+def _fs_cache_key(receipt_id: Optional[str], qr_code: Optional[str]) -> tuple:
+    return (
+        receipt_id.strip() if receipt_id else None,
+        qr_code.strip() if qr_code else None,
+    )
+
+
+async def _fetch_receipt_uncached(
+    receipt_id: Optional[str], qr_code: Optional[str]
+) -> dict[str, Any]:
     payload = {}
     if receipt_id:
-        payload["receiptId"] = receipt_id.strip()
+        payload["receiptId"] = receipt_id
     if qr_code:
-        payload["qrCode"] = qr_code.strip()
+        payload["qrCode"] = qr_code
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            response = await client.post(FS_API_URL, json=payload)
-            response.raise_for_status()
+        response = await fs_client.get_client().find(payload)
+        response.raise_for_status()
+    except fs_client.CircuitOpenError as exc:
+        raise ReceiptFetchError(
+            status_code=503, detail="FS API je dočasne nedostupné, skús to neskôr"
+        ) from exc
     except httpx.HTTPStatusError as exc:
         detail = exc.response.text or exc.response.reason_phrase or "FS API error"
         status_code = exc.response.status_code
@@ -52,10 +182,63 @@ async def fetch_receipt_from_fs(
             status_code=503, detail="FS API je momentálne nedostupné"
         ) from exc
 
-    data = response.json()
+    try:
+        data = response.json()
+    except ValueError as exc:
+        # e.g. an HTML maintenance page served with 200
+        raise ReceiptFetchError(status_code=502, detail="FS API vrátilo neplatnú odpoveď") from exc
+    if not isinstance(data, dict):
+        raise ReceiptFetchError(status_code=502, detail="FS API vrátilo neplatnú odpoveď")
     return data
 
 
+async def _fetch_and_cache(key: tuple) -> dict[str, Any]:
+    try:
+        with _stage["fs_fetch"].time():
+            data = await _fetch_receipt_uncached(*key)
+    except ReceiptFetchError as exc:
+        if exc.status_code == 404:
+            _fs_not_found.set(key, exc.detail)
+        raise
+    _fs_payloads.set(key, data)
+    return data
+
+
+async def fetch_receipt_from_fs(
+    receipt_id: Optional[str] = None, qr_code: Optional[str] = None
+) -> dict[str, Any]:
+    if not receipt_id and not qr_code:
+        raise ValueError("receipt_id alebo qr_code je povinné")
+
+    key = _fs_cache_key(receipt_id, qr_code)
+    data = _fs_payloads.get(key)
+    if data is not cache.MISSING:
+        return data
+    not_found = _fs_not_found.get(key)
+    if not_found is not cache.MISSING:
+        raise ReceiptFetchError(status_code=404, detail=not_found)
+    return await _fs_lookups.do(key, lambda: _fetch_and_cache(key))
+
+
+async def fetch_many_from_fs(
+    lookups: list[tuple[Optional[str], Optional[str]]],
+    concurrency: int = FS_FETCH_CONCURRENCY,
+) -> list[Any]:
+    """Fetch (receipt_id, qr_code) pairs concurrently; failures are returned, not raised."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch_one(receipt_id, qr_code):
+        async with semaphore:
+            try:
+                return await fetch_receipt_from_fs(receipt_id=receipt_id, qr_code=qr_code)
+            except ReceiptFetchError as exc:
+                return exc
+
+    return await asyncio.gather(
+        *(fetch_one(receipt_id, qr_code) for receipt_id, qr_code in lookups)
+    )
+
+
 def _normalize_receipt(raw_payload: dict[str, Any]) -> tuple[dict[str, Any], list[dict[str, Any]]]:
     receipt = raw_payload.get("receipt") or raw_payload
 
@@ -67,10 +250,7 @@ def _normalize_receipt(raw_payload: dict[str, Any]) -> tuple[dict[str, Any], lis
     )
     issue_date = None
     if issue_date_raw:
-        try:
-            issue_date = parser.isoparse(issue_date_raw)
-        except (ValueError, TypeError):
-            issue_date = None
+        issue_date = normalizer.parse_timestamp(issue_date_raw)
 
     merchant_info = receipt.get("merchant") or receipt.get("merchantProfile") or {}
     base_merchant = (
@@ -125,83 +305,759 @@ def _normalize_receipt(raw_payload: dict[str, Any]) -> tuple[dict[str, Any], lis
     return normalized_receipt, normalized_items
 
 
-def _match_category(session: Session, item_name: str, merchant: Optional[str]) -> tuple[Optional[models.Category], Optional[str]]:
-    lowered = f"{item_name} {merchant or ''}".lower()
-    rules = session.scalars(
-        select(models.CategoryRule).options(joinedload(models.CategoryRule.category))
-    ).all()
-    for rule in rules:
-        if rule.pattern in lowered:
-            return rule.category, rule.category.name if rule.category else None
-    return None, None
+def normalize_many(
+    raw_payloads: list[dict[str, Any]],
+) -> list[tuple[dict[str, Any], list[dict[str, Any]]]]:
+    return [_normalize_receipt(payload) for payload in raw_payloads]
 
 
-def persist_receipt(session: Session, payload: dict[str, Any], source: str = "fs") -> models.Receipt:
-    normalized_receipt, normalized_items = _normalize_receipt(payload)
+def prepare_receipt(
+    payload: dict[str, Any],
+    source: str,
+    matcher: categorizer.RuleMatcher,
+    normalized: Optional[tuple[dict[str, Any], list[dict[str, Any]]]] = None,
+    time_zone: Optional[tzinfo] = None,
+) -> PreparedReceipt:
+    """Normalize, categorize and compress one payload for insert_prepared.
+
+    `time_zone` is the database session time zone (database.session_time_zone),
+    looked up on first use when not given; forked workers pass it in so they
+    never touch the engine.
+    """
+    if normalized is None:
+        with _stage["normalize"].time():
+            normalized = _normalize_receipt(payload)
+    normalized_receipt, normalized_items = normalized
     if not normalized_receipt["receipt_id"]:
         raise ValueError("V odpovedi FS chýba receiptId")
 
-    existing = session.execute(
-        select(models.Receipt).where(
-            models.Receipt.receipt_id == normalized_receipt["receipt_id"]
+    with _stage["categorize"].time():
+        matches = matcher.categorize_many(
+            [item["name"] for item in normalized_items], normalized_receipt["merchant_name"]
         )
-    ).scalar_one_or_none()
-    if existing:
-        raise ReceiptAlreadyExists(existing)
-
-    receipt = models.Receipt(
+    items = [
+        {
+            **item,
+            "category_id": match.category_id if match else None,
+            "suggested_category": match.category_name if match else None,
+        }
+        for item, match in zip(normalized_items, matches)
+    ]
+    # naive FS timestamps are stored as Postgres reads them (session time
+    # zone); made aware here so partition_date is the UTC date of that value
+    issue_date = normalized_receipt["issue_date"]
+    if issue_date is not None and issue_date.tzinfo is None:
+        issue_date = issue_date.replace(tzinfo=time_zone or session_time_zone())
+    created_at = datetime.now(timezone.utc)
+    receipt = {
         **normalized_receipt,
-        source_payload=payload,
-        source=source,
+        "issue_date": issue_date,
+        "id": uuid.uuid4(),
+        "source": source,
+        "created_at": created_at,
+        "partition_date": partitioning.partition_date(issue_date, created_at),
+        "okp": ekasa.payload_okp(payload),
+    }
+    with _stage["compress"].time():
+        encoding, data = payloads.compress(payload)
+    return PreparedReceipt(
+        receipt=receipt, items=items, payload_encoding=encoding, payload_data=data
     )
-    session.add(receipt)
-    session.flush()
-
-    for item in normalized_items:
-        category, suggested = _match_category(session, item["name"], receipt.merchant_name)
-        session.add(
-            models.Item(
-                receipt_id=receipt.id,
-                name=item["name"],
-                quantity=item["quantity"],
-                unit_price=item["unit_price"],
-                total_price=item["total_price"],
-                category=category,
-                suggested_category=suggested,
+
+
+def insert_prepared(session: Session, prepared: list[PreparedReceipt]) -> BulkPersistResult:
+    """Insert receipts with ON CONFLICT (receipt_id) DO NOTHING and the items of
+    the new ones in one multi-row insert. Does not commit; the cache
+    invalidation NOTIFY for other processes goes out with the commit."""
+    result = BulkPersistResult()
+    unique: dict[str, PreparedReceipt] = {}
+    for entry in prepared:
+        receipt_id = entry.receipt["receipt_id"]
+        if receipt_id in unique:
+            result.duplicates.append(receipt_id)
+        else:
+            unique[receipt_id] = entry
+
+    receipts_table = models.Receipt.__table__
+    batch = list(unique.values())
+    with _stage["insert"].time():
+        for start in range(0, len(batch), BULK_INSERT_CHUNK):
+            chunk = batch[start : start + BULK_INSERT_CHUNK]
+            stmt = (
+                pg_insert(receipts_table)
+                .values([entry.receipt for entry in chunk])
+                .on_conflict_do_nothing(index_elements=[receipts_table.c.receipt_id])
+                .returning(receipts_table.c.id, receipts_table.c.receipt_id)
+            )
+            result.created.update(
+                {receipt_id: pk for pk, receipt_id in session.execute(stmt).all()}
+            )
+
+        created = [
+            (result.created[receipt_id], entry)
+            for receipt_id, entry in unique.items()
+            if receipt_id in result.created
+        ]
+        if created:
+            session.execute(
+                insert(models.ReceiptPayload.__table__),
+                [
+                    {"receipt_id": pk, "encoding": entry.payload_encoding, "data": entry.payload_data}
+                    for pk, entry in created
+                ],
             )
+        item_rows = [
+            {"receipt_id": pk, "partition_date": entry.receipt["partition_date"], **item}
+            for pk, entry in created
+            for item in entry.items
+        ]
+        if item_rows:
+            session.execute(insert(models.Item.__table__), item_rows)
+    with _stage["rollup"].time():
+        result.months = rollup.apply_receipts(
+            session,
+            result.created.values(),
+            {entry.receipt["partition_date"] for _, entry in created},
         )
 
+    for receipt_id, entry in unique.items():
+        # rolled back inserts only cost a false positive
+        _known_receipts.add(receipt_id)
+        if entry.receipt["okp"]:
+            _known_receipts.add(entry.receipt["okp"])
+    result.issue_months = {
+        (entry.receipt["partition_date"].year, entry.receipt["partition_date"].month)
+        if entry.receipt["issue_date"] is not None
+        else None
+        for _, entry in created
+    }
+    result.duplicates.extend(
+        receipt_id for receipt_id in unique if receipt_id not in result.created
+    )
+    if result.created:
+        _notify_invalidation(session, _persisted_tags(result))
+        _notify_known(
+            session,
+            [
+                key
+                for _, entry in created
+                for key in (entry.receipt["receipt_id"], entry.receipt["okp"])
+                if key
+            ],
+        )
+    return result
+
+
+_notify_many = text(
+    "SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload"
+).bindparams(bindparam("payloads", type_=ARRAY(Text)))
+
+
+def _notify_known(session: Session, keys: list[str]) -> None:
+    # as many NOTIFYs as the payload limit needs, in one statement; sent on commit
+    def payload(chunk: list[str]) -> str:
+        return json.dumps({"from": _process_token, "keys": chunk}, separators=(",", ":"))
+
+    payloads = []
+    chunk: list[str] = []
+    size = len(payload([]))
+    for key in keys:
+        # the key as JSON plus its comma
+        key_size = len(json.dumps(key)) + 1
+        if chunk and size + key_size > _MAX_NOTIFY_PAYLOAD:
+            payloads.append(payload(chunk))
+            chunk, size = [], len(payload([]))
+        chunk.append(key)
+        size += key_size
+    if chunk:
+        payloads.append(payload(chunk))
+    if payloads:
+        session.execute(_notify_many, {"channel": KNOWN_RECEIPTS_CHANNEL, "payloads": payloads})
+
+
+def handle_known_receipts(payload: str) -> None:
+    """Add the receipt_ids/OKPs NOTIFYed on KNOWN_RECEIPTS_CHANNEL by another
+    process to the known receipts filter."""
+    try:
+        message = json.loads(payload)
+        if message["from"] == _process_token:
+            return
+        keys = message["keys"]
+    except (ValueError, TypeError, KeyError):
+        # cannot tell what was inserted: exact lookups until the next load
+        logger.warning("malformed known receipts notification %r", payload[:200])
+        _known_receipts.loaded = False
+        return
+    for key in keys:
+        _known_receipts.add(key)
+
+
+def suspend_known_receipts() -> None:
+    """Send every lookup to the database until the filter is loaded again
+    (the listener lost its connection, inserts elsewhere may be missing)."""
+    _known_receipts.loaded = False
+
+
+def load_known_receipts(session: Session, stop: Optional[threading.Event] = None) -> Optional[int]:
+    """Fill the Bloom filter of known receipts from the database.
+
+    Sized for twice the stored receipts (at least KNOWN_RECEIPTS_CAPACITY).
+    Receipts inserted while loading are added to the same filter. Returns
+    the number of receipts read, or None when `stop` was set first (the
+    filter then stays unloaded).
+    """
+    count = session.scalar(select(func.count()).select_from(models.Receipt))
+    _known_receipts.reset(max(KNOWN_RECEIPTS_CAPACITY, 2 * count))
+    loaded = 0
+    rows = session.execute(
+        select(models.Receipt.receipt_id, models.Receipt.okp).execution_options(
+            stream_results=True, yield_per=KNOWN_RECEIPTS_LOAD_CHUNK
+        )
+    )
+    for receipt_id, okp in rows:
+        if loaded % KNOWN_RECEIPTS_LOAD_CHUNK == 0 and stop is not None and stop.is_set():
+            rows.close()
+            return None
+        _known_receipts.add(receipt_id)
+        if okp:
+            _known_receipts.add(okp)
+        loaded += 1
+    _known_receipts.loaded = True
+    return loaded
+
+
+def find_known_receipts(session: Session, keys: list[Optional[ekasa.ReceiptKey]]) -> list[Optional[str]]:
+    """receipt_id of the stored receipt each fetch request key (ekasa.receipt_key)
+    points to, or None; one query for all keys the Bloom filter may know,
+    none for keys it has never seen (and for None keys)."""
+    candidates = []
+    for key in keys:
+        if key is None:
+            continue
+        if _known_receipts.might_contain(key.value):
+            candidates.append(key)
+        else:
+            _known_lookups["filtered"].inc()
+    found: dict[tuple[str, str], str] = {}
+    if candidates:
+        ids = {key.value for key in candidates if key.kind == "id"}
+        okps = {key.value for key in candidates if key.kind == "okp"}
+        criteria = []
+        if ids:
+            criteria.append(models.Receipt.receipt_id.in_(ids))
+        if okps:
+            criteria.append(models.Receipt.okp.in_(okps))
+        rows = session.execute(
+            select(models.Receipt.receipt_id, models.Receipt.okp).where(or_(*criteria))
+        ).all()
+        for receipt_id, okp in rows:
+            found[("id", receipt_id)] = receipt_id
+            if okp:
+                found.setdefault(("okp", okp), receipt_id)
+        for key in candidates:
+            _known_lookups["hit" if (key.kind, key.value) in found else "miss"].inc()
+    return [found.get((key.kind, key.value)) if key is not None else None for key in keys]
+
+
+def find_known_receipt(session: Session, key: ekasa.ReceiptKey) -> Optional[str]:
+    """receipt_id of the stored receipt a fetch request (ekasa.receipt_key) points
+    to, or None. Keys the Bloom filter has never seen skip the database."""
+    return find_known_receipts(session, [key])[0]
+
+
+def month_tag(year: int, month: int) -> str:
+    return f"month:{year:04d}-{month:02d}"
+
+
+def _utc_month(value: datetime) -> tuple[int, int]:
+    moment = partitioning.partition_date(value, value)
+    return moment.year, moment.month
+
+
+def _month_span_tags(low: date, high: date) -> list[str]:
+    first, last = partitioning.month_start(low), partitioning.month_start(high)
+    count = (last.year - first.year) * 12 + last.month - first.month + 1
+    if count > MAX_RANGE_TAGS:
+        return [WIDE_RANGE_TAG]
+    months = (partitioning.add_months(first, offset) for offset in range(max(count, 0)))
+    return [month_tag(month.year, month.month) for month in months]
+
+
+def range_tags(start: Optional[datetime], end: Optional[datetime]) -> list[str]:
+    """Tags of a result over issue_date in [start, end)."""
+    low, high = partitioning.date_bounds(start, end)
+    if low is None or high is None:
+        return [WIDE_RANGE_TAG]
+    return _month_span_tags(low, high)
+
+
+def receipt_page_tags(cursor: Optional[str], page: list[Row], next_cursor: Optional[str]) -> list[str]:
+    """Tags of a `list_receipts` page: the months between its bounds.
+
+    The first page (no cursor) also stands for everything newer and for the
+    undated receipts listed first, the last page for everything older; both
+    are evicted by any new receipt.
+    """
+    tags = []
+    high = None
+    if cursor is None:
+        tags += [LIST_HEAD_TAG, UNDATED_TAG]
+    else:
+        high, _ = decode_cursor(cursor)
+        if high is None:
+            tags.append(UNDATED_TAG)
+    if next_cursor is None:
+        tags.append(LIST_TAIL_TAG)
+    dated = [row.issue_date for row in page if row.issue_date is not None]
+    if dated:
+        low = _utc_month(min(dated))
+        high = _utc_month(high or max(dated))
+        tags += _month_span_tags(date(*low, 1), date(*high, 1))
+    return tags
+
+
+def receipt_tags(receipt_id: str) -> list[str]:
+    return [DETAILS_TAG, f"receipt:{receipt_id}"]
+
+
+def apply_invalidation(tags: Optional[Iterable[str]]) -> None:
+    """Drop the cached read results carrying any of `tags` (all of them for None)."""
+    for tagged in (read_cache, _series_cache):
+        if tags is None:
+            tagged.clear()
+        else:
+            tagged.invalidate(*tags)
+
+
+def _invalidation_payload(tags: Optional[set[str]]) -> str:
+    payload = json.dumps({"from": _process_token, "tags": sorted(tags) if tags is not None else None})
+    if len(payload.encode()) > _MAX_NOTIFY_PAYLOAD:
+        payload = json.dumps({"from": _process_token, "tags": None})
+    return payload
+
+
+def _notify_invalidation(session: Session, tags: Optional[set[str]]) -> None:
+    # Redis caches are shared already; in-process ones are told through
+    # Postgres (see handle_invalidation), which delivers the NOTIFY only when
+    # the session's transaction commits
+    if READ_CACHE_URL is None:
+        session.execute(select(func.pg_notify(INVALIDATION_CHANNEL, _invalidation_payload(tags))))
+
+
+def _publish_invalidation(tags: Optional[set[str]]) -> None:
+    # for writes already committed (cli recategorize, partitions drop); a
+    # failure only leaves the other processes with entries until READ_CACHE_TTL
     try:
-        session.commit()
+        with Session(engine) as session, session.begin():
+            _notify_invalidation(session, tags)
+    except SQLAlchemyError:
+        logger.exception("publishing read cache invalidation %s failed", tags)
+
+
+def handle_invalidation(payload: str) -> None:
+    """Apply an invalidation NOTIFYed on INVALIDATION_CHANNEL by another process."""
+    try:
+        message = json.loads(payload)
+        if message["from"] == _process_token:
+            return
+        tags = message["tags"]
+    except (ValueError, TypeError, KeyError):
+        logger.warning("malformed read cache invalidation %r, clearing", payload)
+        tags = None
+    apply_invalidation(tags)
+
+
+def _invalidate(tags: Optional[set[str]]) -> None:
+    apply_invalidation(tags)
+    _publish_invalidation(tags)
+
+
+def _persisted_tags(result: BulkPersistResult) -> set[str]:
+    tags = {LIST_HEAD_TAG, LIST_TAIL_TAG, WIDE_RANGE_TAG}
+    # rollup months follow the database time zone, the others UTC
+    tags.update(month_tag(*month) for month in result.months)
+    tags.update(month_tag(*month) if month else UNDATED_TAG for month in result.issue_months)
+    return tags
+
+
+def receipts_persisted(result: BulkPersistResult) -> None:
+    """Drop cached read results that a committed bulk insert made stale: the
+    first list pages and the list pages, stats and series of its months.
+    Other processes are told by the NOTIFY insert_prepared queued in the
+    same transaction."""
+    if result.created:
+        apply_invalidation(_persisted_tags(result))
+
+
+def categories_changed(months: Optional[set[tuple[int, int]]] = None) -> None:
+    """Drop cached read results after stored item categories were rewritten,
+    for the given (year, month) pairs or everywhere."""
+    if months is None:
+        _invalidate(None)
+        return
+    _invalidate({DETAILS_TAG, WIDE_RANGE_TAG, *(month_tag(*month) for month in months)})
+
+
+def receipts_deleted() -> None:
+    """Drop all cached read results after receipts were removed."""
+    _invalidate(None)
+
+
+def persist_receipts_bulk(
+    session: Session, entries: list[tuple[dict[str, Any], str]]
+) -> BulkPersistResult:
+    matcher = categorizer.get_matcher(session)
+    with _stage["normalize"].time():
+        normalized = normalize_many([payload for payload, _ in entries])
+    prepared = [
+        prepare_receipt(payload, source, matcher, normalized=entry)
+        for (payload, source), entry in zip(entries, normalized)
+    ]
+    result = insert_prepared(session, prepared)
+    try:
+        with _stage["commit"].time():
+            session.commit()
     except IntegrityError:
         session.rollback()
         raise
+    receipts_persisted(result)
+    return result
+
+
+def persist_receipt(session: Session, payload: dict[str, Any], source: str = "fs") -> models.Receipt:
+    result = persist_receipts_bulk(session, [(payload, source)])
+    receipt_id = next(iter(result.created), None) or result.duplicates[0]
+    with _stage["load"].time():
+        receipt = get_receipt(session, receipt_id=receipt_id)
+    if not result.created:
+        raise ReceiptAlreadyExists(receipt)
     return receipt
 
 
-def list_receipts(session: Session, limit: int = 50) -> list[models.Receipt]:
-    stmt = select(models.Receipt).order_by(models.Receipt.issue_date.desc()).limit(limit)
-    return session.execute(stmt).scalars().all()
+async def persist_receipt_async(
+    session: AsyncSession, payload: dict[str, Any], source: str = "fs"
+) -> models.Receipt:
+    return await session.run_sync(persist_receipt, payload, source)
+
+
+def persist_receipts_grouped(
+    session: Session,
+    entries: list[tuple[dict[str, Any], str]],
+    group_size: int = BATCH_PERSIST_GROUP_SIZE,
+) -> list[BatchEntryOutcome]:
+    """Persist (payload, source) pairs with one bulk insert and commit per group."""
+    matcher = categorizer.get_matcher(session)
+    outcomes: list[Optional[BatchEntryOutcome]] = [None] * len(entries)
+    group_size = max(1, group_size)
+    for start in range(0, len(entries), group_size):
+        prepared: list[tuple[int, PreparedReceipt]] = []
+        for index in range(start, min(start + group_size, len(entries))):
+            payload, source = entries[index]
+            try:
+                prepared.append((index, prepare_receipt(payload, source, matcher)))
+            except ValueError as exc:
+                outcomes[index] = BatchEntryOutcome("failed", 422, detail=str(exc))
+        groups = [prepared]
+        while groups:
+            group = groups.pop()
+            try:
+                result = insert_prepared(session, [entry for _, entry in group])
+                with _stage["commit"].time():
+                    session.commit()
+                receipts_persisted(result)
+            except DBAPIError as exc:
+                status_code = rejected_status(exc)
+                if status_code is None:
+                    raise
+                session.rollback()
+                if status_code == 409:
+                    for index, entry in group:
+                        outcomes[index] = BatchEntryOutcome(
+                            "failed", 409, entry.receipt["receipt_id"], detail=str(exc.orig)
+                        )
+                    continue
+                if len(group) > 1:
+                    # a value the columns reject (e.g. an item name over 255
+                    # characters): retry one by one so only its entry fails
+                    groups.extend([entry] for entry in reversed(group))
+                    continue
+                (index, entry), = group
+                outcomes[index] = BatchEntryOutcome(
+                    "failed", 422, entry.receipt["receipt_id"], detail=str(exc.orig)
+                )
+                continue
+            seen: set[str] = set()
+            for index, entry in group:
+                receipt_id = entry.receipt["receipt_id"]
+                if receipt_id in result.created and receipt_id not in seen:
+                    outcomes[index] = BatchEntryOutcome("created", 201, receipt_id)
+                else:
+                    outcomes[index] = BatchEntryOutcome("exists", 200, receipt_id)
+                seen.add(receipt_id)
+    return outcomes
+
+
+async def persist_receipts_grouped_async(
+    session: AsyncSession,
+    entries: list[tuple[dict[str, Any], str]],
+    group_size: int = BATCH_PERSIST_GROUP_SIZE,
+) -> list[BatchEntryOutcome]:
+    return await session.run_sync(persist_receipts_grouped, entries, group_size)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def encode_cursor(issue_date: Optional[datetime], pk: uuid.UUID) -> str:
+    raw = json.dumps([issue_date.isoformat() if issue_date else None, str(pk)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        issue_date_raw, pk = json.loads(base64.urlsafe_b64decode(padded))
+        issue_date = datetime.fromisoformat(issue_date_raw) if issue_date_raw else None
+        return issue_date, uuid.UUID(pk)
+    except (ValueError, TypeError, AttributeError) as exc:
+        # not base64/JSON, or elements of the wrong type ([1, 2] and the like)
+        raise InvalidCursor("Neplatný kurzor stránkovania") from exc
+
+
+def get_receipt_payload(session: Session, receipt_id: str) -> Optional[dict[str, Any]]:
+    row = session.execute(
+        select(models.ReceiptPayload.encoding, models.ReceiptPayload.data)
+        .join(models.Receipt, models.ReceiptPayload.receipt_id == models.Receipt.id)
+        .where(models.Receipt.receipt_id == receipt_id)
+    ).one_or_none()
+    return payloads.decompress(row.encoding, row.data) if row else None
+
+
+def _receipt_columns() -> tuple:
+    receipt = models.Receipt
+    return (receipt.id, receipt.receipt_id, receipt.issue_date, receipt.merchant_name, receipt.total_amount)
+
+
+def list_receipts(
+    session: Session,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    merchant: Optional[str] = None,
+    source: Optional[str] = None,
+    min_total: Optional[float] = None,
+    max_total: Optional[float] = None,
+) -> tuple[list[Row], Optional[str]]:
+    """Page through receipts newest first, keyed on (issue_date, id).
+
+    Receipts without issue_date sort first, like the plain `issue_date DESC`
+    did. Returns the page as rows of the `schemas.ReceiptOut` columns and the
+    cursor of the next one (None on the last).
+    """
+    receipt = models.Receipt
+    stmt = select(*_receipt_columns())
+    if date_from is not None:
+        stmt = stmt.where(receipt.issue_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(receipt.issue_date < date_to)
+    if merchant:
+        stmt = stmt.where(
+            func.lower(receipt.merchant_name).like(_escape_like(merchant.lower()) + "%", escape="\\")
+        )
+    if source:
+        stmt = stmt.where(receipt.source == source)
+    if min_total is not None:
+        stmt = stmt.where(receipt.total_amount >= min_total)
+    if max_total is not None:
+        stmt = stmt.where(receipt.total_amount <= max_total)
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        if after_date is None:
+            stmt = stmt.where(
+                or_(
+                    and_(receipt.issue_date.is_(None), receipt.id < after_id),
+                    receipt.issue_date.is_not(None),
+                )
+            )
+        else:
+            stmt = stmt.where(tuple_(receipt.issue_date, receipt.id) < tuple_(after_date, after_id))
+
+    stmt = stmt.order_by(receipt.issue_date.desc().nulls_first(), receipt.id.desc())
+    rows = session.execute(stmt.limit(limit + 1)).all()
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(page[-1].issue_date, page[-1].id)
+    return page, next_cursor
+
+
+def receipt_etag(
+    pk: uuid.UUID, created_at: Optional[datetime], updated_at: Optional[datetime] = None
+) -> str:
+    stamp = created_at.isoformat() if created_at else ""
+    if updated_at:
+        stamp += f"/{updated_at.isoformat()}"
+    return '"' + hashlib.sha1(f"{pk}:{stamp}".encode()).hexdigest() + '"'
+
+
+def get_receipt_etag(session: Session, receipt_id: str) -> Optional[str]:
+    """ETag of a stored receipt, read from the receipts row only."""
+    row = session.execute(
+        select(
+            models.Receipt.id, models.Receipt.created_at, models.Receipt.updated_at
+        ).where(models.Receipt.receipt_id == receipt_id)
+    ).one_or_none()
+    return receipt_etag(row.id, row.created_at, row.updated_at) if row else None
+
+
+def get_receipt_detail(session: Session, receipt_id: str) -> Optional[dict[str, Any]]:
+    """A receipt with its items as plain dicts shaped like `schemas.ReceiptDetail`."""
+    row = session.execute(
+        select(*_receipt_columns(), models.Receipt.partition_date).where(
+            models.Receipt.receipt_id == receipt_id
+        )
+    ).one_or_none()
+    if row is None:
+        return None
+    receipt = row._asdict()
+    partition_date = receipt.pop("partition_date")
+    item = models.Item
+    items = session.execute(
+        select(
+            item.id,
+            item.name,
+            item.quantity,
+            item.unit_price,
+            item.total_price,
+            models.Category.name.label("category"),
+            item.suggested_category,
+        )
+        .outerjoin(models.Category, item.category_id == models.Category.id)
+        .where(item.receipt_id == row.id, item.partition_date == partition_date)
+        .order_by(item.id)
+    ).all()
+    return {**receipt, "items": [entry._asdict() for entry in items]}
 
 
 def get_receipt(session: Session, receipt_id: str) -> Optional[models.Receipt]:
     return session.execute(
-        select(models.Receipt).where(models.Receipt.receipt_id == receipt_id)
+        select(models.Receipt)
+        .where(models.Receipt.receipt_id == receipt_id)
+        .options(selectinload(models.Receipt.items).joinedload(models.Item.category))
     ).scalar_one_or_none()
 
 
 def monthly_stats(session: Session, year: int, month: int) -> list[tuple[str, float]]:
-    category_label = func.coalesce(
-        models.Category.name,
-        func.coalesce(models.Item.suggested_category, "Nezaradené"),
-    )
+    return rollup.monthly_totals(session, year=year, month=month)
+
+
+def stats_series(
+    session: Session,
+    start: datetime,
+    end: datetime,
+    granularity: str = "month",
+    group_by: str = "category",
+) -> list[tuple[datetime, str, float, int]]:
+    """(period start, group, total, item count) rows for issue_date in [start, end)."""
+    key = (start, end, granularity, group_by)
+    cached = _series_cache.get(key)
+    if cached is not cache.MISSING:
+        return cached
+    snapshot = _series_cache.snapshot()
+
+    period = func.date_trunc(granularity, models.Receipt.issue_date)
+    group = SERIES_GROUPS[group_by]()
     stmt = (
-        select(category_label.label("category"), func.sum(models.Item.total_price))
+        select(
+            period,
+            group,
+            func.coalesce(func.sum(models.Item.total_price), 0.0),
+            func.count(models.Item.id),
+        )
+        .select_from(models.Item)
         .join(models.Receipt, models.Item.receipt_id == models.Receipt.id)
         .outerjoin(models.Category, models.Item.category_id == models.Category.id)
-        .where(extract("year", models.Receipt.issue_date) == year)
-        .where(extract("month", models.Receipt.issue_date) == month)
-        .group_by(category_label)
+        .where(
+            models.Receipt.issue_date >= start,
+            models.Receipt.issue_date < end,
+            *partitioning.prune(models.Item.partition_date, start, end),
+        )
+        .group_by(period, group)
+        .order_by(period, group)
     )
-    results = session.execute(stmt).all()
-    return [(row[0], float(row[1] or 0)) for row in results]
+    rows = [
+        (period_start, label, float(total), count)
+        for period_start, label, total, count in session.execute(stmt).all()
+    ]
+    _series_cache.set(key, rows, range_tags(start, end), snapshot=snapshot)
+    return rows
+
+
+def _text_match(column, query: str, mode: str):
+    if mode == "fuzzy":
+        # word similarity: the query resembles some word inside the column
+        return column.op("%>")(query)
+    pattern = _escape_like(query)
+    if mode == "prefix":
+        return column.ilike(pattern + "%", escape="\\")
+    return column.ilike("%" + pattern + "%", escape="\\")
+
+
+def search_items(
+    session: Session,
+    query: str,
+    target: str = "item",
+    mode: str = "contains",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = 50,
+) -> tuple[tuple[int, int, float], list]:
+    """Items whose name (target="item") or merchant (target="merchant") match.
+
+    Returns (item count, receipt count, total) over all matches plus the newest
+    `limit` matching items.
+    """
+    column = models.Item.name if target == "item" else models.Receipt.merchant_name
+    criteria = [_text_match(column, query, mode)]
+    if date_from is not None:
+        criteria.append(models.Receipt.issue_date >= date_from)
+    if date_to is not None:
+        criteria.append(models.Receipt.issue_date < date_to)
+    criteria.extend(partitioning.prune(models.Item.partition_date, date_from, date_to))
+
+    def matching(stmt):
+        return (
+            stmt.select_from(models.Item)
+            .join(models.Receipt, models.Item.receipt_id == models.Receipt.id)
+            .where(*criteria)
+        )
+
+    item_count, receipt_count, total = session.execute(
+        matching(
+            select(
+                func.count(models.Item.id),
+                func.count(func.distinct(models.Item.receipt_id)),
+                func.coalesce(func.sum(models.Item.total_price), 0.0),
+            )
+        )
+    ).one()
+    hits = session.execute(
+        matching(
+            select(
+                models.Item.id.label("item_id"),
+                models.Receipt.receipt_id,
+                models.Receipt.issue_date,
+                models.Receipt.merchant_name,
+                models.Item.name,
+                models.Item.quantity,
+                models.Item.total_price,
+                rollup.category_label().label("category"),
+            )
+        )
+        .outerjoin(models.Category, models.Item.category_id == models.Category.id)
+        .order_by(models.Receipt.issue_date.desc().nulls_last(), models.Item.id.desc())
+        .limit(limit)
+    ).all()
+    return (item_count, receipt_count, float(total)), hits